@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Offline download benchmark: seeds synthetic torrents from local libtorrent
+sessions on 127.0.0.1 and downloads them with TorrentDownloader, once per
+session profile, reporting metadata latency, throughput, CPU and peak RSS.
+
+    python benchmark_download.py --shapes one-huge many-small --seeders 4
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_PORT = 52000
+PIECE_SIZE_KB = 1024
+
+SHAPES = {
+    'one-huge': lambda total_mb, small_files: [('huge.bin', total_mb * 1024**2)],
+    'many-small': lambda total_mb, small_files: [
+        (os.path.join(f'dir{i // 100:03d}', f'file{i:05d}.bin'), total_mb * 1024**2 // small_files)
+        for i in range(small_files)
+    ],
+    'mixed': lambda total_mb, small_files: [('big.bin', total_mb * 1024**2 // 2)] + [
+        (os.path.join('small', f'file{i:05d}.bin'), total_mb * 1024**2 // 2 // small_files)
+        for i in range(small_files)
+    ],
+}
+
+
+def import_libtorrent():
+    try:
+        import libtorrent as lt
+        return lt
+    except ImportError:
+        print('❌ libtorrent is not installed - run torrent_to_gdrive_standalone.py once or install python3-libtorrent')
+        sys.exit(1)
+
+
+def make_payload(root: str, name: str, files: list) -> str:
+    payload = os.path.join(root, name)
+    block = os.urandom(1024 * 1024)
+    for rel_path, size in files:
+        path = os.path.join(payload, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            remaining = size
+            while remaining > 0:
+                f.write(block[:min(remaining, len(block))])
+                remaining -= len(block)
+    return payload
+
+
+def make_torrent(lt, payload: str, torrent_path: str):
+    fs = lt.file_storage()
+    lt.add_files(fs, payload)
+    ct = lt.create_torrent(fs, PIECE_SIZE_KB * 1024)
+    lt.set_piece_hashes(ct, os.path.dirname(payload))
+    with open(torrent_path, 'wb') as f:
+        f.write(lt.bencode(ct.generate()))
+    return lt.torrent_info(torrent_path)
+
+
+def start_seeders(lt, torrent_info, save_path: str, count: int, base_port: int) -> list:
+    seeders = []
+    for i in range(count):
+        port = base_port + i
+        session = lt.session({
+            'listen_interfaces': f'127.0.0.1:{port}',
+            'enable_dht': False,
+            'enable_lsd': False,
+            'enable_upnp': False,
+            'enable_natpmp': False,
+            'allow_multiple_connections_per_ip': True,
+            'upload_rate_limit': 0,
+            'alert_mask': 0,
+        })
+        params = lt.add_torrent_params()
+        params.ti = lt.torrent_info(torrent_info)
+        params.save_path = save_path
+        params.flags |= lt.torrent_flags.seed_mode
+        session.add_torrent(params)
+        seeders.append((session, port))
+    return seeders
+
+
+def run_worker(args):
+    # STATE_DIR is derived from the working directory, so caches and resume data stay in the scratch dir
+    os.chdir(args.workdir)
+    os.environ['TORRENT_METRICS'] = '0'
+    sys.path.insert(0, SCRIPT_DIR)
+    import torrent_to_gdrive_standalone as t2g
+
+    session = t2g.get_global_session()
+    t2g.apply_profile(args.profile)
+    session.apply_settings({
+        'listen_interfaces': '127.0.0.1:0',
+        'enable_dht': False,
+        'enable_lsd': False,
+        'allow_multiple_connections_per_ip': True,
+    })
+
+    downloader = t2g.TorrentDownloader()
+    cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+
+    started = time.monotonic()
+    info = downloader.analyze_torrent(args.magnet, add_trackers=False, keep_handle=True)
+    metadata_seconds = time.monotonic() - started
+    if not info:
+        print(json.dumps({'error': 'metadata'}))
+        return
+
+    started = time.monotonic()
+    ok = downloader.download(args.magnet, os.path.join(args.workdir, 'download'), add_trackers=False)
+    download_seconds = time.monotonic() - started
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    print(json.dumps({
+        'ok': ok,
+        'bytes': info['total_size'],
+        'metadata_seconds': round(metadata_seconds, 3),
+        'download_seconds': round(download_seconds, 3),
+        'mb_per_second': round(info['total_size'] / (1024**2) / max(download_seconds, 1e-3), 1),
+        'cpu_seconds': round(usage.ru_utime + usage.ru_stime - cpu_start.ru_utime - cpu_start.ru_stime, 2),
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+    }))
+
+
+def run_profile(magnet: str, profile: str, scratch: str, timeout: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f'{profile}-', dir=scratch)
+    cmd = [sys.executable, os.path.abspath(__file__), '--worker', '--magnet', magnet,
+           '--profile', profile, '--workdir', workdir]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'error': f'timeout after {timeout}s'}
+    finally:
+        shutil.rmtree(os.path.join(workdir, 'download'), ignore_errors=True)
+
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith('{'):
+            return json.loads(line)
+    return {'error': (proc.stderr.strip().splitlines() or ['no output'])[-1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline loopback benchmark for the torrent download path')
+    parser.add_argument('--shapes', nargs='+', choices=list(SHAPES), default=['one-huge', 'many-small'])
+    parser.add_argument('--profiles', nargs='+', default=None, help='Session profiles to compare (default: all)')
+    parser.add_argument('--size-mb', type=int, default=1024, help='Payload size per shape')
+    parser.add_argument('--small-files', type=int, default=2000, help='File count for the small-file shapes')
+    parser.add_argument('--seeders', type=int, default=4)
+    parser.add_argument('--timeout', type=int, default=1800, help='Per-run timeout in seconds')
+    parser.add_argument('--scratch', default=None, help='Scratch directory (default: a temp dir, removed afterwards)')
+    parser.add_argument('--json', metavar='FILE', help='Also write the results as JSON')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--magnet', help=argparse.SUPPRESS)
+    parser.add_argument('--profile', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    lt = import_libtorrent()
+    sys.path.insert(0, SCRIPT_DIR)
+    from torrent_to_gdrive_standalone import SESSION_PROFILES
+    profiles = args.profiles or list(SESSION_PROFILES)
+
+    scratch = args.scratch or tempfile.mkdtemp(prefix='t2g-bench-')
+    os.makedirs(scratch, exist_ok=True)
+    results = []
+    try:
+        for n, shape in enumerate(args.shapes):
+            print(f'📦 Generating {shape} payload ({args.size_mb} MB)...', flush=True)
+            seed_dir = os.path.join(scratch, 'seed', shape)
+            payload = make_payload(seed_dir, shape, SHAPES[shape](args.size_mb, args.small_files))
+            torrent_info = make_torrent(lt, payload, os.path.join(scratch, f'{shape}.torrent'))
+
+            base_port = BASE_PORT + n * args.seeders
+            seeders = start_seeders(lt, torrent_info, seed_dir, args.seeders, base_port)
+            magnet = lt.make_magnet_uri(torrent_info) + ''.join(f'&x.pe=127.0.0.1:{port}' for _, port in seeders)
+            time.sleep(1)
+
+            for profile in profiles:
+                print(f'⬇️ {shape} / {profile}...', flush=True)
+                result = dict(run_profile(magnet, profile, scratch, args.timeout), shape=shape, profile=profile)
+                results.append(result)
+
+            for session, _ in seeders:
+                session.pause()
+            shutil.rmtree(seed_dir, ignore_errors=True)
+    finally:
+        if not args.scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"\n{'shape':<12} {'profile':<10} {'meta s':>8} {'dl s':>8} {'MB/s':>8} {'CPU s':>8} {'RSS MB':>8}")
+    for r in results:
+        if 'error' in r:
+            print(f"{r['shape']:<12} {r['profile']:<10} ❌ {r['error']}")
+            continue
+        print(f"{r['shape']:<12} {r['profile']:<10} {r['metadata_seconds']:>8} {r['download_seconds']:>8} "
+              f"{r['mb_per_second']:>8} {r['cpu_seconds']:>8} {r['peak_rss_mb']:>8}" + ('' if r['ok'] else ' ❌'))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import os
+import sys
+import types
+import zipfile
+import io
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import torrent_to_gdrive_standalone as t2g
+
+
+class FakeMediaIoBaseUpload:
+    def __init__(self, stream, mimetype, chunksize, resumable):
+        self.stream = stream
+
+
+def test_upload_zip_stream_marks_sources_uploaded(tmp_path, monkeypatch):
+    http = types.ModuleType('googleapiclient.http')
+    http.MediaIoBaseUpload = FakeMediaIoBaseUpload
+    monkeypatch.setitem(sys.modules, 'googleapiclient', types.ModuleType('googleapiclient'))
+    monkeypatch.setitem(sys.modules, 'googleapiclient.http', http)
+
+    payload = tmp_path / 'payload'
+    (payload / 'sub').mkdir(parents=True)
+    (payload / 'a.txt').write_bytes(b'alpha')
+    (payload / 'sub' / 'b.txt').write_bytes(b'beta' * 1000)
+    inventory = t2g.LocalInventory(root=str(payload), path=str(tmp_path / 'inventory.json'))
+    monkeypatch.setattr(t2g, '_inventory', inventory)
+
+    uploaded = {}
+
+    def fake_upload_media(media, file_name, file_size, folder_name, session_key, source=None):
+        uploaded[file_name] = media.stream.read()
+        return True
+
+    uploader = t2g.DriveUploader(status_callback=lambda msg, style: None)
+    monkeypatch.setattr(uploader, '_upload_media', fake_upload_media)
+
+    sources = t2g.collect_zip_sources(str(payload), str(tmp_path))
+    assert uploader.upload_zip_stream(sources, 'payload.zip', 'Torrent')
+
+    with zipfile.ZipFile(io.BytesIO(uploaded['payload.zip'])) as zf:
+        assert sorted(zf.namelist()) == ['a.txt', 'sub/b.txt']
+    for path, _ in sources:
+        assert inventory.was_uploaded(path, os.path.getsize(path))
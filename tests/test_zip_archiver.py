@@ -0,0 +1,54 @@
+import os
+import sys
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import torrent_to_gdrive_standalone as t2g
+
+
+def _payload(tmp_path):
+    root = tmp_path / 'payload'
+    (root / 'nested' / 'deeper').mkdir(parents=True)
+    files = {
+        'text.txt': b'compress me ' * 10000,
+        'random.bin': os.urandom(256 * 1024),
+        'video.mp4': os.urandom(64 * 1024),
+        'empty.txt': b'',
+        os.path.join('nested', 'deeper', 'notes.txt'): 'ünïcode '.encode('utf-8') * 500,
+    }
+    for rel, data in files.items():
+        (root / rel).write_bytes(data)
+    return root, files
+
+
+def test_archive_round_trips(tmp_path):
+    root, files = _payload(tmp_path)
+    zip_path = tmp_path / 'out.zip'
+    count = t2g.ZipArchiver(lambda msg, style: None, workers=2).create(
+        t2g.collect_zip_sources(str(root), str(tmp_path)), str(zip_path))
+    assert count == len(files)
+
+    with zipfile.ZipFile(zip_path) as zf:
+        assert zf.testzip() is None
+        infos = {info.filename: info for info in zf.infolist()}
+        assert set(infos) == {rel.replace(os.sep, '/') for rel in files}
+        for rel, data in files.items():
+            assert zf.read(rel.replace(os.sep, '/')) == data
+
+
+def test_compression_methods(tmp_path):
+    root, _ = _payload(tmp_path)
+    zip_path = tmp_path / 'out.zip'
+    t2g.ZipArchiver(lambda msg, style: None, workers=2).create(
+        t2g.collect_zip_sources(str(root), str(tmp_path)), str(zip_path))
+
+    with zipfile.ZipFile(zip_path) as zf:
+        methods = {info.filename: info.compress_type for info in zf.infolist()}
+    assert methods['text.txt'] == zipfile.ZIP_DEFLATED
+    assert methods['nested/deeper/notes.txt'] == zipfile.ZIP_DEFLATED
+    # Incompressible data falls back to stored after deflating, known media extensions skip deflate entirely
+    assert methods['random.bin'] == zipfile.ZIP_STORED
+    assert methods['video.mp4'] == zipfile.ZIP_STORED
+    assert methods['empty.txt'] == zipfile.ZIP_STORED
+    assert not [p for p in os.listdir(tmp_path) if p.endswith('.part')]
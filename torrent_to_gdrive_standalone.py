@@ -5,70 +5,269 @@ import os
 import time
 import threading
 import logging
-from concurrent.futures import ThreadPoolExecutor
+import queue
+import struct
+import zlib
+import collections
+import io
+import bisect
+import json
+import random
+import hashlib
+import mimetypes
+import uuid
+import html
+import array
+import argparse
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from typing import Optional, Callable
-from urllib.parse import quote
+from urllib.parse import quote, urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
-def install_dependencies():
-    print('🚀 Installing dependencies...', flush=True)
-    try:
-        subprocess.run(['apt-get', 'update'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30)
-        subprocess.run(['apt-get', 'install', '-y', 'python3-libtorrent'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True, timeout=90)
-        print('✅ libtorrent installed via apt', flush=True)
-    except Exception as e:
-        print(f'⚠️ apt failed: {e}', flush=True)
-    
-    for path in ['/usr/lib/python3/dist-packages', '/usr/lib/python3.10/dist-packages', '/usr/lib/python3.11/dist-packages', '/usr/lib/python3.12/dist-packages']:
+DIST_PACKAGES_PATHS = ['/usr/lib/python3/dist-packages', '/usr/lib/python3.10/dist-packages', '/usr/lib/python3.11/dist-packages', '/usr/lib/python3.12/dist-packages']
+REQUIRED_MODULES = {
+    'googleapiclient': 'google-api-python-client',
+    'google_auth_httplib2': 'google-auth-httplib2',
+    'google_auth_oauthlib': 'google-auth-oauthlib',
+}
+GUI_MODULES = {'ipywidgets': 'ipywidgets'}
+LIBTORRENT_MIN_VERSION = (1, 2)
+
+lt = None
+widgets = None
+
+
+def _add_dist_packages():
+    for path in DIST_PACKAGES_PATHS:
         if os.path.exists(path) and path not in sys.path:
             sys.path.insert(0, path)
-    
+
+
+def _libtorrent_ok() -> bool:
+    _add_dist_packages()
+    importlib.invalidate_caches()
     try:
-        import libtorrent as lt
-        print(f'✅ libtorrent {lt.__version__} ready', flush=True)
+        import libtorrent
     except ImportError:
-        print('⚠️ Trying alternative installation...', flush=True)
-        try:
-            subprocess.run([sys.executable, '-m', 'pip', 'install', '--force-reinstall', '--no-cache-dir', 'libtorrent'], check=True, timeout=180)
-            print('✅ libtorrent installed via pip', flush=True)
-        except Exception as e:
-            print(f'❌ Installation failed: {e}', flush=True)
-            raise RuntimeError('Cannot install libtorrent') from e
-    
+        return False
     try:
-        subprocess.run([sys.executable, '-m', 'pip', 'install', '-q', 'ipywidgets', 'google-api-python-client', 'google-auth-httplib2', 'google-auth-oauthlib'], check=True, timeout=120)
-        print('✅ All dependencies ready', flush=True)
-    except Exception as e:
-        raise RuntimeError('Cannot install packages') from e
+        version = tuple(int(v) for v in libtorrent.__version__.split('.')[:2])
+    except (AttributeError, ValueError):
+        return True
+    return version >= LIBTORRENT_MIN_VERSION
+
+
+def _missing_modules(drive: bool = True, gui: bool = False) -> dict:
+    modules = dict(REQUIRED_MODULES if drive else {}, **(GUI_MODULES if gui else {}))
+    return {name: pkg for name, pkg in modules.items() if importlib.util.find_spec(name) is None}
+
+
+def _wheelhouse_dir() -> str:
+    base = DRIVE_STATE_DIR if os.path.exists('/content/drive/MyDrive') else STATE_DIR
+    return os.path.join(base, 'wheels', f'cp{sys.version_info.major}{sys.version_info.minor}')
+
 
-install_dependencies()
+def _pip_install(packages: list, timeout: int = 180) -> bool:
+    wheelhouse = _wheelhouse_dir()
+    local = [sys.executable, '-m', 'pip', 'install', '-q', '--no-index', '--find-links', wheelhouse, *packages]
+    if os.path.isdir(wheelhouse) and subprocess.run(local, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=timeout).returncode == 0:
+        return True
+    try:
+        os.makedirs(wheelhouse, exist_ok=True)
+        subprocess.run([sys.executable, '-m', 'pip', 'wheel', '-q', '--wheel-dir', wheelhouse, *packages],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True, timeout=timeout)
+        return subprocess.run(local, timeout=timeout).returncode == 0
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f'⚠️ Wheel cache unavailable: {e}', flush=True)
+    return subprocess.run([sys.executable, '-m', 'pip', 'install', '-q', *packages], timeout=timeout).returncode == 0
+
+
+def _apt_install_libtorrent() -> bool:
+    cmd = ['apt-get', 'install', '-y', '-q', 'python3-libtorrent']
+    try:
+        if subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=90).returncode == 0:
+            return True
+        subprocess.run(['apt-get', 'update'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=60)
+        return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=90).returncode == 0
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f'⚠️ apt failed: {e}', flush=True)
+        return False
 
-try:
-    import ipywidgets as widgets
-    import libtorrent as lt
-except ImportError as e:
-    print(f'❌ Import failed: {e}')
-    print('💡 Restart runtime and try again')
-    sys.exit(1)
+
+def install_dependencies(libtorrent: bool = True, drive: bool = True, gui: bool = False):
+    need_libtorrent = libtorrent and not _libtorrent_ok()
+    missing = _missing_modules(drive, gui)
+    if not need_libtorrent and not missing:
+        return
+    
+    print('🚀 Installing dependencies...', flush=True)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        apt = pool.submit(_apt_install_libtorrent) if need_libtorrent else None
+        pip = pool.submit(_pip_install, list(missing.values())) if missing else None
+        
+        if apt is not None:
+            if apt.result() and _libtorrent_ok():
+                print('✅ libtorrent installed via apt', flush=True)
+            else:
+                print('⚠️ Trying pip installation...', flush=True)
+                try:
+                    ok = _pip_install(['libtorrent']) and _libtorrent_ok()
+                except subprocess.SubprocessError as e:
+                    ok = False
+                    print(f'❌ Installation failed: {e}', flush=True)
+                if not ok:
+                    raise RuntimeError('Cannot install libtorrent')
+                print('✅ libtorrent installed via pip', flush=True)
+        
+        if pip is not None:
+            try:
+                ok = pip.result()
+            except subprocess.SubprocessError as e:
+                raise RuntimeError('Cannot install packages') from e
+            importlib.invalidate_caches()
+            if not ok or _missing_modules(drive, gui):
+                raise RuntimeError('Cannot install packages')
+    print('✅ All dependencies ready', flush=True)
+
+
+def load_libtorrent():
+    global lt
+    if lt is None:
+        install_dependencies(drive=False)
+        import libtorrent as lt
+    return lt
+
+
+def load_widgets():
+    global widgets
+    if widgets is None:
+        install_dependencies(libtorrent=False, drive=False, gui=True)
+        import ipywidgets as widgets
+        if IN_COLAB:
+            try:
+                from google.colab import output
+                output.enable_custom_widget_manager()
+            except Exception as e:
+                logger.warning(f"Custom widget manager unavailable: {e}")
+    return widgets
 
 import shutil
 import zipfile
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
 logger = logging.getLogger(__name__)
 
 MAX_CONCURRENT_THREADS = 2
 METADATA_TIMEOUT_SECONDS = 900
 BANDWIDTH_LIMIT_DOWNLOAD_MBPS = 25
 BANDWIDTH_LIMIT_UPLOAD_MBPS = 5
+PIPELINE_WINDOW_GB = 8
+ALERT_WAIT_MS = 500
+STATE_UPDATE_INTERVAL_SECONDS = 1
+EVENT_FALLBACK_SECONDS = 30
+METADATA_CACHE_MAX_MB = 256
+HANDLE_IDLE_EXPIRY_SECONDS = 600
+RESUME_SAVE_INTERVAL_SECONDS = 60
+RESUME_SAVE_TIMEOUT_SECONDS = 10
+ZIP_WORKERS = os.cpu_count() or 2
+UPLOAD_WORKERS = 4
+UPLOAD_CHUNK_MIN_MB = 8
+UPLOAD_CHUNK_MAX_MB = 256
+UPLOAD_CHUNK_TARGET_SECONDS = 8
+UPLOAD_MAX_RETRIES = 8
+UPLOAD_BACKOFF_MAX_SECONDS = 64
+UPLOAD_SESSION_MAX_AGE_SECONDS = 6 * 24 * 3600
+UPLOAD_RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+FOLDER_CACHE_TTL_SECONDS = 600
+PEER_CACHE_MAX_PER_TORRENT = 200
+PEER_CACHE_MAX_TORRENTS = 500
+DHT_STATE_SAVE_INTERVAL_SECONDS = 300
+TRACKER_LIMIT = 20
+METRICS_ENABLED = os.environ.get('TORRENT_METRICS', '1') != '0'
+METRICS_INTERVAL_SECONDS = 10
+METRICS_MAX_MB = 64
+METRICS_SESSION_COUNTERS = [
+    'net.recv_bytes', 'net.sent_bytes', 'net.recv_payload_bytes', 'net.recv_redundant_bytes',
+    'peer.num_peers_connected', 'peer.num_peers_up_unchoked', 'peer.num_peers_down_interested',
+    'disk.queued_disk_jobs', 'disk.queued_write_bytes', 'disk.num_jobs', 'disk.num_blocks_written',
+    'dht.dht_nodes', 'ses.num_downloading_torrents', 'ses.waste_piece_timed_out',
+]
+FILE_PICKER_PAGE_SIZE = 50
+INVENTORY_SAVE_INTERVAL_SECONDS = 5
+HASH_CACHE_SAVE_INTERVAL_SECONDS = 5
+WAVE_BUDGET_FRACTION = 0.8
+LOG_BUFFER_LINES = 500
+LOG_FLUSH_INTERVAL_SECONDS = 0.3
+LOG_SPILL_MAX_MB = 16
+STREAM_PORT = 8765
+STREAM_READAHEAD_PIECES = 16
+STREAM_DEADLINE_STEP_MS = 200
+STREAM_BUFFER_PIECES = 8
+TRACKER_DEAD_FAILURES = 5
+TRACKER_RETRY_HOURS = 12
+TRACKER_SAVE_INTERVAL_SECONDS = 60
+PEER_SOURCES = ((16, 'cache'), (1, 'tracker'), (2, 'dht'), (4, 'pex'), (8, 'lsd'), (32, 'incoming'))
 
 IN_COLAB = 'google.colab' in sys.modules
-LOCAL_DIR = '/content/torrents' if IN_COLAB else './torrents'
+SESSION_PROFILE = os.environ.get('TORRENT_PROFILE', 'colab-max' if IN_COLAB else 'balanced')
+AUTOTUNE_INTERVAL_SECONDS = 15
+AUTOTUNE_MIN_FREE_MB = 1024
+AUTOTUNE_MAX_DOWNLOAD_MBPS = 500
 
-try:
-    os.makedirs(LOCAL_DIR, exist_ok=True)
-except OSError as e:
-    print(f'❌ Failed to create directories: {e}')
-    sys.exit(1)
+SESSION_PROFILES = {
+    'colab-max': {
+        'download_rate_limit': 0,
+        'upload_rate_limit': BANDWIDTH_LIMIT_UPLOAD_MBPS * 4 * 1024 * 1024,
+        'connections_limit': 2000,
+        'connection_speed': 200,
+        'aio_threads': 16,
+        'hashing_threads': 4,
+        'cache_size': 65536,
+        'send_buffer_watermark': 8 * 1024 * 1024,
+        'send_buffer_low_watermark': 1024 * 1024,
+        'send_buffer_watermark_factor': 150,
+        'max_queued_disk_bytes': 64 * 1024 * 1024,
+        'max_out_request_queue': 1500,
+        'choking_algorithm': 2,
+        'unchoke_slots_limit': 64,
+    },
+    'balanced': {
+        'download_rate_limit': BANDWIDTH_LIMIT_DOWNLOAD_MBPS * 1024 * 1024,
+        'upload_rate_limit': BANDWIDTH_LIMIT_UPLOAD_MBPS * 1024 * 1024,
+        'connections_limit': 500,
+        'connection_speed': 50,
+        'aio_threads': 8,
+        'hashing_threads': 2,
+        'cache_size': 16384,
+        'send_buffer_watermark': 2 * 1024 * 1024,
+        'send_buffer_low_watermark': 256 * 1024,
+        'send_buffer_watermark_factor': 100,
+        'max_queued_disk_bytes': 16 * 1024 * 1024,
+        'max_out_request_queue': 500,
+        'choking_algorithm': 0,
+        'unchoke_slots_limit': 8,
+    },
+    'low-mem': {
+        'download_rate_limit': BANDWIDTH_LIMIT_DOWNLOAD_MBPS * 1024 * 1024,
+        'upload_rate_limit': 1024 * 1024,
+        'connections_limit': 100,
+        'connection_speed': 20,
+        'aio_threads': 2,
+        'hashing_threads': 1,
+        'cache_size': 2048,
+        'send_buffer_watermark': 512 * 1024,
+        'send_buffer_low_watermark': 64 * 1024,
+        'send_buffer_watermark_factor': 50,
+        'max_queued_disk_bytes': 4 * 1024 * 1024,
+        'max_out_request_queue': 250,
+        'choking_algorithm': 0,
+        'unchoke_slots_limit': 4,
+    },
+}
+LOCAL_DIR = '/content/torrents' if IN_COLAB else './torrents'
+STATE_DIR = os.path.join(os.path.dirname(os.path.abspath(LOCAL_DIR)), '.torrent_state')
+DRIVE_STATE_DIR = '/content/drive/MyDrive/.torrent_state'
+LOG_SPILL_PATH = os.path.join(STATE_DIR, 'torrent.log')
 
 PUBLIC_TRACKERS = [
     'udp://tracker.opentrackr.org:1337/announce',
@@ -83,10 +282,13 @@ PUBLIC_TRACKERS = [
 ]
 
 drive_mounted = False
-if IN_COLAB:
+
+def mount_drive() -> bool:
+    global drive_mounted
+    if drive_mounted or not IN_COLAB:
+        return drive_mounted
     try:
-        from google.colab import drive as colab_drive, output
-        output.enable_custom_widget_manager()
+        from google.colab import drive as colab_drive
         
         if not os.path.exists('/content/drive/MyDrive'):
             print('📁 Mounting Google Drive...')
@@ -98,52 +300,1329 @@ if IN_COLAB:
         print(f'⚠️ Not running in Colab environment: {e}')
     except Exception as e:
         print(f'⚠️ Drive mount skipped: {e}')
+    return drive_mounted
 
 _global_session = None
 _session_lock = threading.Lock()
 
+def profile_settings(profile: str) -> dict:
+    if profile not in SESSION_PROFILES:
+        raise ValueError(f"Unknown session profile '{profile}' (choose from {', '.join(SESSION_PROFILES)})")
+    supported = lt.default_settings()
+    return {k: v for k, v in SESSION_PROFILES[profile].items() if k in supported}
+
+
+def apply_profile(profile: str):
+    session = get_global_session()
+    session.apply_settings(profile_settings(profile))
+    if _auto_tuner is not None:
+        _auto_tuner.rebase()
+    logger.info(f"Applied session profile {profile}")
+
+
 def get_global_session():
     global _global_session
     if _global_session is None:
         with _session_lock:
             if _global_session is None:
+                load_libtorrent()
                 try:
                     settings = {
+                        **profile_settings(SESSION_PROFILE),
                         'enable_dht': True,
                         'enable_lsd': True,
                         'enable_natpmp': False,
                         'enable_upnp': False,
-                        'connections_limit': 500,
-                        'download_rate_limit': 25 * 1024 * 1024,
-                        'upload_rate_limit': 5 * 1024 * 1024,
+                        'announce_to_all_trackers': True,
+                        'announce_to_all_tiers': True,
                         'active_downloads': 10,
                         'active_seeds': 5,
                         'active_limit': 15,
-                        'alert_mask': lt.alert.category_t.error_notification | lt.alert.category_t.status_notification,
+                        'alert_mask': (lt.alert.category_t.error_notification | lt.alert.category_t.status_notification |
+                                       lt.alert.category_t.storage_notification | lt.alert.category_t.file_progress_notification |
+                                       lt.alert.category_t.piece_progress_notification | lt.alert.category_t.tracker_notification),
                     }
                     _global_session = lt.session(settings)
-                    logger.info("Global torrent session initialized")
+                    load_dht_state(_global_session)
+                    logger.info(f"Global torrent session initialized ({SESSION_PROFILE})")
                 except Exception as e:
                     logger.error(f"Failed to create libtorrent session: {e}")
                     raise RuntimeError(f"Could not initialize torrent session: {e}")
     return _global_session
 
 
+def _info_hash_key(obj) -> str:
+    hashes = getattr(obj, 'info_hashes', None)
+    if hashes is not None:
+        hashes = hashes() if callable(hashes) else hashes
+        return str(hashes.v1 if hashes.has_v1() else hashes.get_best())
+    info_hash = obj.info_hash
+    return str(info_hash() if callable(info_hash) else info_hash)
+
+
+def _atomic_write(path: str, data) -> bool:
+    if not isinstance(data, (str, bytes)):
+        data = json.dumps(data)
+    tmp_path = f'{path}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(tmp_path, 'wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return True
+    except OSError as e:
+        logger.warning(f"Could not write {path}: {e}")
+        return False
+
+
+class AlertDispatcher:
+    
+    def __init__(self, session):
+        self.session = session
+        self._subscribers = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='alert_dispatcher', daemon=True)
+                self._thread.start()
+    
+    def subscribe(self, info_hash: str, callback: Callable):
+        with self._lock:
+            self._subscribers.setdefault(info_hash, []).append(callback)
+        self.start()
+    
+    def listen(self, callback: Callable):
+        with self._lock:
+            self._listeners.append(callback)
+        self.start()
+    
+    def unsubscribe(self, info_hash: str, callback: Callable):
+        with self._lock:
+            callbacks = self._subscribers.get(info_hash, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._subscribers.pop(info_hash, None)
+    
+    def _publish(self, info_hash: str, event: str, payload):
+        with self._lock:
+            callbacks = list(self._subscribers.get(info_hash, []))
+        for callback in callbacks:
+            try:
+                callback(event, payload)
+            except Exception as e:
+                logger.error(f"Alert subscriber failed on {event}: {e}")
+    
+    def _dispatch(self, alert):
+        if isinstance(alert, lt.state_update_alert):
+            for status in alert.status:
+                self._publish(_info_hash_key(status.handle), 'state_update', status)
+            return
+        
+        for listener in self._listeners:
+            try:
+                listener(alert)
+            except Exception as e:
+                logger.error(f"Alert listener failed on {alert.what()}: {e}")
+        
+        handle = getattr(alert, 'handle', None)
+        if handle is None:
+            return
+        try:
+            info_hash = _info_hash_key(handle) if handle.is_valid() else _info_hash_key(alert)
+        except Exception:
+            return
+        self._publish(info_hash, alert.what(), alert)
+    
+    def _run(self):
+        last_update = 0.0
+        while True:
+            try:
+                self.session.wait_for_alert(ALERT_WAIT_MS)
+                now = time.monotonic()
+                if now - last_update >= STATE_UPDATE_INTERVAL_SECONDS:
+                    self.session.post_torrent_updates()
+                    last_update = now
+                for alert in self.session.pop_alerts():
+                    self._dispatch(alert)
+            except Exception as e:
+                logger.error(f"Alert dispatcher error: {e}")
+                time.sleep(1)
+
+
+def _normalize_tracker(url: str) -> str:
+    url = url.strip()
+    parsed = urlparse(url)
+    return parsed._replace(scheme=parsed.scheme.lower(), netloc=parsed.netloc.lower()).geturl().rstrip('/')
+
+
+class TrackerRegistry:
+    
+    def __init__(self, path: str = os.path.join(STATE_DIR, 'trackers.json'), defaults: Optional[list] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_save = 0.0
+        self._trackers = {}
+        for url in PUBLIC_TRACKERS if defaults is None else defaults:
+            self.add(url)
+        try:
+            with open(self.path) as f:
+                self._trackers.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+    
+    def add(self, url: str) -> bool:
+        key = _normalize_tracker(url)
+        if not key or key in self._trackers:
+            return False
+        self._trackers[key] = {'url': url.strip(), 'announces': 0, 'successes': 0, 'failures': 0, 'streak': 0,
+                               'peers': 0, 'latency': None, 'last_success': None, 'last_failure': None}
+        return True
+    
+    def import_file(self, path: str) -> int:
+        with open(path) as f:
+            urls = [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+        with self._lock:
+            added = sum(self.add(url) for url in urls)
+            for url in urls:
+                stats = self._trackers.get(_normalize_tracker(url))
+                if stats is not None:
+                    stats['streak'] = 0
+        self.save(force=True)
+        return added
+    
+    def _score(self, stats: dict) -> float:
+        success_rate = (stats['successes'] + 1) / (stats['announces'] + 2)
+        peers_per_reply = stats['peers'] / max(1, stats['successes'])
+        latency = stats['latency'] if stats['latency'] is not None else 1.0
+        return success_rate * (1 + peers_per_reply) / (1 + latency)
+    
+    def is_dead(self, stats: dict) -> bool:
+        # Dead trackers get another try once the cooldown has passed; one more failure restarts it
+        if stats['streak'] < TRACKER_DEAD_FAILURES:
+            return False
+        return time.time() - (stats.get('last_failure') or 0) < TRACKER_RETRY_HOURS * 3600
+    
+    def ranked(self, limit: int = TRACKER_LIMIT) -> list:
+        with self._lock:
+            alive = [stats for stats in self._trackers.values() if not self.is_dead(stats)]
+        return [stats['url'] for stats in sorted(alive, key=self._score, reverse=True)[:limit]]
+    
+    def on_alert(self, alert):
+        what = alert.what()
+        if what not in ('tracker_announce', 'tracker_reply', 'tracker_error'):
+            return
+        url = alert.tracker_url() if hasattr(alert, 'tracker_url') else alert.url
+        key = _normalize_tracker(url)
+        with self._lock:
+            stats = self._trackers.get(key)
+            if stats is None:
+                return
+            pending_key = (key, _info_hash_key(alert.handle) if alert.handle.is_valid() else '')
+            if what == 'tracker_announce':
+                self._pending[pending_key] = time.monotonic()
+                return
+            
+            started = self._pending.pop(pending_key, None)
+            stats['announces'] += 1
+            if what == 'tracker_reply':
+                stats['successes'] += 1
+                stats['streak'] = 0
+                stats['peers'] += alert.num_peers
+                stats['last_success'] = time.time()
+                if started is not None:
+                    latency = time.monotonic() - started
+                    stats['latency'] = latency if stats['latency'] is None else 0.7 * stats['latency'] + 0.3 * latency
+            else:
+                stats['failures'] += 1
+                stats['streak'] += 1
+                stats['last_failure'] = time.time()
+        self.save()
+    
+    def save(self, force: bool = False):
+        if not force and time.monotonic() - self._last_save < TRACKER_SAVE_INTERVAL_SECONDS:
+            return
+        self._last_save = time.monotonic()
+        with self._lock:
+            data = json.dumps(self._trackers)
+        _atomic_write(self.path, data)
+
+
+class MetadataCache:
+    
+    def __init__(self, cache_dir: str = os.path.join(STATE_DIR, 'metadata'),
+                 max_bytes: int = METADATA_CACHE_MAX_MB * 1024**2):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+    
+    def _path(self, info_hash: str) -> str:
+        return os.path.join(self.cache_dir, f'{info_hash}.torrent')
+    
+    def load(self, info_hash: str):
+        path = self._path(info_hash)
+        if not os.path.isfile(path):
+            return None
+        try:
+            torrent_info = lt.torrent_info(path)
+            os.utime(path)
+            return torrent_info
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cached metadata {path}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+    
+    def store(self, info_hash: str, torrent_info):
+        try:
+            info_section = torrent_info.info_section() if hasattr(torrent_info, 'info_section') else torrent_info.metadata()
+            data = b'd4:info' + bytes(info_section) + b'e'
+            with self._lock:
+                if _atomic_write(self._path(info_hash), data):
+                    self._evict()
+        except Exception as e:
+            logger.warning(f"Could not cache metadata for {info_hash}: {e}")
+    
+    def _evict(self):
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.torrent'):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+
+_dht_last_save = 0.0
+
+def _dht_state_path() -> str:
+    return os.path.join(STATE_DIR, 'dht.state')
+
+
+def load_dht_state(session):
+    path = _dht_state_path()
+    if not os.path.isfile(path):
+        return
+    try:
+        with open(path, 'rb') as f:
+            session.load_state(lt.bdecode(f.read()))
+        logger.info("Loaded DHT routing table")
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable DHT state {path}: {e}")
+
+
+def save_dht_state(force: bool = False):
+    global _dht_last_save
+    if _global_session is None or (not force and time.monotonic() - _dht_last_save < DHT_STATE_SAVE_INTERVAL_SECONDS):
+        return
+    _dht_last_save = time.monotonic()
+    try:
+        state = _global_session.save_state()
+        dht = {k: v for k, v in state.items() if (k.decode() if isinstance(k, bytes) else k) == 'dht state'}
+        if not dht:
+            return
+        _atomic_write(_dht_state_path(), lt.bencode(dht))
+    except Exception as e:
+        logger.warning(f"Could not save DHT state: {e}")
+
+
+class PeerCache:
+    
+    def __init__(self, path: str = os.path.join(STATE_DIR, 'peers.json')):
+        self.path = path
+        self._lock = threading.Lock()
+    
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def load(self, info_hash: str) -> list:
+        with self._lock:
+            entry = self._read().get(info_hash)
+        return [tuple(peer) for peer in entry['peers']] if entry else []
+    
+    def store(self, info_hash: str, peers: list):
+        if not peers:
+            return
+        with self._lock:
+            data = self._read()
+            known = [tuple(p) for p in data.get(info_hash, {}).get('peers', [])]
+            merged = list(dict.fromkeys(list(peers) + known))[:PEER_CACHE_MAX_PER_TORRENT]
+            data[info_hash] = {'peers': merged, 'used': time.time()}
+            if len(data) > PEER_CACHE_MAX_TORRENTS:
+                for key in sorted(data, key=lambda k: data[k]['used'])[:len(data) - PEER_CACHE_MAX_TORRENTS]:
+                    del data[key]
+            _atomic_write(self.path, data)
+
+
+class ResumeStore:
+    
+    def __init__(self, resume_dir: str = os.path.join(STATE_DIR, 'resume'), mirror_dir: Optional[str] = None):
+        self.resume_dir = resume_dir
+        self.mirror_dir = mirror_dir
+        if mirror_dir is None and drive_mounted:
+            self.mirror_dir = os.path.join(DRIVE_STATE_DIR, 'resume')
+    
+    def _dirs(self):
+        return [d for d in (self.resume_dir, self.mirror_dir) if d]
+    
+    def save(self, info_hash: str, params):
+        data = lt.write_resume_data_buf(params)
+        for directory in self._dirs():
+            _atomic_write(os.path.join(directory, f'{info_hash}.fastresume'), data)
+    
+    def load(self, info_hash: str):
+        for directory in self._dirs():
+            path = os.path.join(directory, f'{info_hash}.fastresume')
+            if not os.path.isfile(path):
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    return lt.read_resume_data(f.read())
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable resume data {path}: {e}")
+        return None
+    
+    def remove(self, info_hash: str):
+        for directory in self._dirs():
+            try:
+                os.remove(os.path.join(directory, f'{info_hash}.fastresume'))
+            except OSError:
+                pass
+
+
+_alert_dispatcher = None
+
+def get_alert_dispatcher() -> AlertDispatcher:
+    global _alert_dispatcher
+    if _alert_dispatcher is None:
+        session = get_global_session()
+        with _session_lock:
+            if _alert_dispatcher is None:
+                _alert_dispatcher = AlertDispatcher(session)
+                _alert_dispatcher.listen(get_tracker_registry().on_alert)
+                _alert_dispatcher.listen(get_metrics().on_alert)
+    return _alert_dispatcher
+
+
+_tracker_registry = None
+_registry_lock = threading.Lock()
+
+def get_tracker_registry() -> TrackerRegistry:
+    global _tracker_registry
+    if _tracker_registry is None:
+        with _registry_lock:
+            if _tracker_registry is None:
+                _tracker_registry = TrackerRegistry()
+    return _tracker_registry
+
+
+def _available_memory_mb() -> Optional[float]:
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class SessionAutoTuner:
+    
+    MEMORY_SETTINGS = ('max_queued_disk_bytes', 'send_buffer_watermark', 'connections_limit')
+    
+    def __init__(self, session, status_callback: Optional[Callable] = None,
+                 interval: float = AUTOTUNE_INTERVAL_SECONDS):
+        self.session = session
+        self.status_callback = status_callback
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._baseline = None
+        self._memory_low = False
+    
+    def log(self, msg: str, style: str = 'info'):
+        if self.status_callback:
+            self.status_callback(msg, style)
+        else:
+            logger.info(msg)
+    
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='session_autotune', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def rebase(self):
+        # The next step snapshots the newly applied profile as the values to restore after memory pressure
+        self._baseline = None
+        self._memory_low = False
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                changes = self.tune()
+                if changes:
+                    self.session.apply_settings(changes)
+                    logger.info(f"Auto-tuned session: {changes}")
+            except Exception as e:
+                logger.warning(f"Auto-tune step failed: {e}")
+    
+    def tune(self) -> dict:
+        settings = self.session.get_settings()
+        if self._baseline is None:
+            self._baseline = {key: settings[key] for key in self.MEMORY_SETTINGS}
+        free_mb = _available_memory_mb()
+        changes = {}
+        
+        if free_mb is not None and free_mb < AUTOTUNE_MIN_FREE_MB:
+            shrunk = {
+                'max_queued_disk_bytes': max(1024 * 1024, settings['max_queued_disk_bytes'] // 2),
+                'send_buffer_watermark': max(256 * 1024, settings['send_buffer_watermark'] // 2),
+                'connections_limit': max(50, settings['connections_limit'] * 3 // 4),
+            }
+            changes = {key: value for key, value in shrunk.items() if value != settings[key]}
+            if not self._memory_low:
+                self._memory_low = True
+                self.log(f'⚠️ Low memory ({free_mb:.0f} MB free) - shrinking buffers', 'warning')
+            return changes
+        
+        # Grow back towards the profile once there is headroom again (2x the threshold, so it does not flap)
+        if free_mb is None or free_mb >= AUTOTUNE_MIN_FREE_MB * 2:
+            for key, target in self._baseline.items():
+                if settings[key] < target:
+                    grown = settings[key] * 4 // 3 if key == 'connections_limit' else settings[key] * 2
+                    changes[key] = min(target, max(grown, settings[key] + 1))
+            if self._memory_low and not changes:
+                self._memory_low = False
+                self.log('✅ Memory recovered - buffers restored to the profile', 'success')
+            if changes:
+                return changes
+        
+        rate = sum(h.status().download_rate for h in self.session.get_torrents())
+        limit = settings['download_rate_limit']
+        if limit and rate >= limit * 0.9:
+            ceiling = AUTOTUNE_MAX_DOWNLOAD_MBPS * 1024 * 1024
+            changes['download_rate_limit'] = 0 if limit * 2 >= ceiling else limit * 2
+            if free_mb is None or free_mb > AUTOTUNE_MIN_FREE_MB * 4:
+                changes['max_queued_disk_bytes'] = min(256 * 1024 * 1024, settings['max_queued_disk_bytes'] * 2)
+                changes['connections_limit'] = min(4000, settings['connections_limit'] * 3 // 2)
+            self.log(f'🚀 Saturating {limit / (1024**2):.0f} MB/s limit - raising it', 'info')
+        return changes
+
+
+_auto_tuner = None
+
+def get_auto_tuner(status_callback: Optional[Callable] = None) -> SessionAutoTuner:
+    global _auto_tuner
+    if _auto_tuner is None:
+        session = get_global_session()
+        with _session_lock:
+            if _auto_tuner is None:
+                _auto_tuner = SessionAutoTuner(session, status_callback)
+    return _auto_tuner
+
+
+class MetricsRecorder:
+    
+    def __init__(self, metrics_dir: str = os.path.join(STATE_DIR, 'metrics'), interval: float = METRICS_INTERVAL_SECONDS):
+        self.metrics_dir = metrics_dir
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._gauges = {}
+        self._counters = {}
+        self._summaries = {}
+        self._stat_names = None
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='metrics', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self.flush()
+    
+    def gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+    
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+    
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            count, total = self._summaries.get(key, (0, 0.0))
+            self._summaries[key] = (count + 1, total + value)
+    
+    def summary(self, record: dict):
+        self._append('jobs.jsonl', [dict(record, ts=time.time())])
+    
+    def on_alert(self, alert):
+        if alert.what() != 'session_stats':
+            return
+        values = alert.values
+        if not isinstance(values, dict):
+            if self._stat_names is None:
+                self._stat_names = {m.value_index: m.name for m in lt.session_stats_metrics()}
+            values = {self._stat_names[i]: v for i, v in enumerate(values) if i in self._stat_names}
+        for name in METRICS_SESSION_COUNTERS:
+            if name in values:
+                self.gauge('libtorrent_' + name.replace('.', '_'), values[name])
+    
+    def _sample(self):
+        session = _global_session
+        if session is None:
+            return
+        with self._lock:
+            self._gauges = {k: v for k, v in self._gauges.items() if not k[0].startswith('torrent_')}
+        totals = {'download_rate': 0, 'upload_rate': 0, 'num_peers': 0}
+        for handle in session.get_torrents():
+            status = handle.status()
+            name = status.name or _info_hash_key(handle)
+            for field in totals:
+                totals[field] += getattr(status, field)
+            self.gauge('torrent_download_bytes_per_second', status.download_rate, torrent=name)
+            self.gauge('torrent_upload_bytes_per_second', status.upload_rate, torrent=name)
+            self.gauge('torrent_peers', status.num_peers, torrent=name)
+            self.gauge('torrent_progress_ratio', status.progress, torrent=name)
+        self.gauge('session_download_bytes_per_second', totals['download_rate'])
+        self.gauge('session_upload_bytes_per_second', totals['upload_rate'])
+        self.gauge('session_peers', totals['num_peers'])
+        session.post_session_stats()
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._sample()
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Metrics sample failed: {e}")
+    
+    def _series(self):
+        with self._lock:
+            for (name, labels), value in self._gauges.items():
+                yield 'gauge', name, labels, value
+            for (name, labels), value in self._counters.items():
+                yield 'counter', name, labels, value
+            for (name, labels), (count, total) in self._summaries.items():
+                yield 'summary', f'{name}_count', labels, count
+                yield 'summary', f'{name}_sum', labels, total
+    
+    def _append(self, file_name: str, records: list):
+        path = os.path.join(self.metrics_dir, file_name)
+        try:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            if os.path.exists(path) and os.path.getsize(path) > METRICS_MAX_MB * 1024**2:
+                os.replace(path, f'{path}.1')
+            with open(path, 'a') as f:
+                f.writelines(json.dumps(r) + '\n' for r in records)
+        except OSError as e:
+            logger.warning(f"Could not write metrics to {path}: {e}")
+    
+    def flush(self):
+        now = time.time()
+        series = list(self._series())
+        if not series:
+            return
+        self._append('metrics.jsonl', [{'ts': now, 'metric': name, 'labels': dict(labels), 'value': value}
+                                       for _, name, labels, value in series])
+        
+        lines = []
+        typed = set()
+        for kind, name, labels, value in series:
+            base = name.rsplit('_', 1)[0] if kind == 'summary' else name
+            if base not in typed:
+                typed.add(base)
+                lines.append(f'# TYPE {base} {kind}')
+            label_text = ','.join(f'{k}={json.dumps(str(v), ensure_ascii=False)}' for k, v in labels)
+            lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+        _atomic_write(os.path.join(self.metrics_dir, 'metrics.prom'), '\n'.join(lines) + '\n')
+
+
+class LocalInventory:
+    
+    def __init__(self, root: str = LOCAL_DIR, path: str = os.path.join(STATE_DIR, 'inventory.json')):
+        self.root = os.path.abspath(root)
+        self.path = path
+        self._lock = threading.RLock()
+        self._last_save = 0.0
+        self._dirty = False
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self._dirs = data.get('dirs', {})
+        self._torrents = data.get('torrents', {})
+        self._uploads = data.get('uploads', {})
+        self._owners = {path: key for key, t in self._torrents.items() for path in t['files']}
+    
+    def record_torrent(self, info_hash: str, name: str, save_path: str, rel_paths: list):
+        files = {}
+        for rel in rel_paths:
+            path = os.path.abspath(os.path.join(save_path, rel))
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files[path] = [st.st_size, st.st_mtime]
+        with self._lock:
+            self._torrents[info_hash] = {'name': name, 'save_path': os.path.abspath(save_path), 'files': files,
+                                         'completed': time.time()}
+            for path, stat in files.items():
+                self._owners[path] = info_hash
+                cached = self._dirs.get(os.path.dirname(path))
+                if cached is not None and os.path.basename(path) in cached['files']:
+                    cached['files'][os.path.basename(path)] = stat
+            self._dirty = True
+        self.save(force=True)
+    
+    def mark_uploaded(self, path: str, folder: str):
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            self._uploads[path] = {'folder': folder, 'size': st.st_size, 'mtime': st.st_mtime, 'ts': time.time()}
+            self._dirty = True
+        self.save()
+    
+    def was_uploaded(self, path: str, size: int, folder: Optional[str] = None) -> bool:
+        entry = self._uploads.get(os.path.abspath(path))
+        return entry is not None and entry['size'] == size and (folder is None or entry['folder'] == folder)
+    
+    def upload_state(self, path: str, size: int, mtime: float) -> Optional[dict]:
+        entry = self._uploads.get(path)
+        if entry and entry['size'] == size and entry['mtime'] == mtime:
+            return entry
+        return None
+    
+    def owner(self, path: str) -> Optional[str]:
+        return self._owners.get(os.path.abspath(path))
+    
+    def torrent_files(self, info_hash: str) -> list:
+        with self._lock:
+            torrent = self._torrents.get(info_hash)
+            if torrent is None:
+                return []
+            return [{'path': path, 'size': size, 'uploaded': self.upload_state(path, size, mtime)}
+                    for path, (size, mtime) in torrent['files'].items() if os.path.exists(path)]
+    
+    def _scan_dir(self, path: str, out: list, seen: set):
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return
+        seen.add(path)
+        cached = self._dirs.get(path)
+        if cached is None or cached['mtime'] != mtime:
+            files, subdirs = {}, []
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.name.startswith('.'):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        elif entry.is_file():
+                            st = entry.stat()
+                            files[entry.name] = [st.st_size, st.st_mtime]
+            except OSError as e:
+                logger.warning(f"Could not scan {path}: {e}")
+                return
+            cached = self._dirs[path] = {'mtime': mtime, 'files': files, 'subdirs': sorted(subdirs)}
+            self._dirty = True
+        else:
+            # Appending to or rewriting a file in place leaves the directory mtime alone
+            for name, stat in cached['files'].items():
+                try:
+                    st = os.stat(os.path.join(path, name))
+                except OSError:
+                    continue
+                if stat != [st.st_size, st.st_mtime]:
+                    cached['files'][name] = [st.st_size, st.st_mtime]
+                    self._dirty = True
+        for name in sorted(cached['files']):
+            size, file_mtime = cached['files'][name]
+            out.append((os.path.join(path, name), size, file_mtime))
+        for name in cached['subdirs']:
+            self._scan_dir(os.path.join(path, name), out, seen)
+    
+    def files(self) -> list:
+        out, seen = [], set()
+        with self._lock:
+            self._scan_dir(self.root, out, seen)
+            for path in set(self._dirs) - seen:
+                del self._dirs[path]
+                self._dirty = True
+            result = []
+            for path, size, mtime in out:
+                owner = self._torrents.get(self._owners.get(path), {})
+                result.append({'path': path, 'size': size, 'torrent': owner.get('name'),
+                               'uploaded': self.upload_state(path, size, mtime)})
+        self.save()
+        return result
+    
+    def save(self, force: bool = False):
+        with self._lock:
+            if not self._dirty or (not force and time.monotonic() - self._last_save < INVENTORY_SAVE_INTERVAL_SECONDS):
+                return
+            data = json.dumps({'dirs': self._dirs, 'torrents': self._torrents, 'uploads': self._uploads})
+            self._dirty = False
+            self._last_save = time.monotonic()
+        _atomic_write(self.path, data)
+
+
+_inventory = None
+
+def get_inventory() -> LocalInventory:
+    global _inventory
+    if _inventory is None:
+        with _registry_lock:
+            if _inventory is None:
+                _inventory = LocalInventory()
+    return _inventory
+
+
+_metrics = None
+
+def get_metrics() -> MetricsRecorder:
+    global _metrics
+    if _metrics is None:
+        with _registry_lock:
+            if _metrics is None:
+                _metrics = MetricsRecorder()
+                if METRICS_ENABLED:
+                    _metrics.start()
+    return _metrics
+
+
 _thread_pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_THREADS, thread_name_prefix="torrent_worker")
 
+ZIP_STORED_EXTENSIONS = {
+    '.mkv', '.mp4', '.m4v', '.avi', '.mov', '.webm', '.wmv', '.flv', '.ts',
+    '.mp3', '.m4a', '.aac', '.flac', '.ogg', '.opus',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp',
+    '.zip', '.rar', '.7z', '.gz', '.bz2', '.xz', '.zst', '.iso', '.epub',
+}
+
+_ZIP_VERSION = 45
+_ZIP_MADE_BY = (3 << 8) | _ZIP_VERSION
+_ZIP_UTF8_FLAG = 0x800
+_ZIP_DESCRIPTOR_FLAG = 0x08
+_ZIP_COPY_CHUNK = 4 * 1024 * 1024
+
+
+def _zip_dos_datetime(mtime: float):
+    t = time.localtime(mtime)
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((max(t.tm_year, 1980) - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def _zip_local_header(entry: dict) -> bytes:
+    name = entry['name'].encode('utf-8')
+    extra = struct.pack('<HHQQ', 0x0001, 16, entry['size'], entry['compressed_size'])
+    return struct.pack('<IHHHHHIIIHH', 0x04034b50, _ZIP_VERSION, entry['flags'], entry['method'],
+                       entry['time'], entry['date'], entry['crc'], 0xFFFFFFFF, 0xFFFFFFFF,
+                       len(name), len(extra)) + name + extra
+
+
+def _zip_data_descriptor(entry: dict) -> bytes:
+    return struct.pack('<IIQQ', 0x08074b50, entry['crc'], entry['compressed_size'], entry['size'])
+
+
+def _zip_central_header(entry: dict) -> bytes:
+    name = entry['name'].encode('utf-8')
+    extra = struct.pack('<HHQQQ', 0x0001, 24, entry['size'], entry['compressed_size'], entry['offset'])
+    return struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, _ZIP_MADE_BY, _ZIP_VERSION, entry['flags'],
+                       entry['method'], entry['time'], entry['date'], entry['crc'], 0xFFFFFFFF, 0xFFFFFFFF,
+                       len(name), len(extra), 0, 0, 0, 0o100644 << 16, 0xFFFFFFFF) + name + extra
+
+
+def _zip_end_records(count: int, cd_offset: int, cd_size: int) -> bytes:
+    zip64_offset = cd_offset + cd_size
+    return (struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, _ZIP_MADE_BY, _ZIP_VERSION, 0, 0,
+                        count, count, cd_size, cd_offset) +
+            struct.pack('<IIQI', 0x07064b50, 0, zip64_offset, 1) +
+            struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, 0xFFFF, 0xFFFF, 0xFFFFFFFF, 0xFFFFFFFF, 0))
+
+
+def _zip_entry(path: str, arcname: str, method: int, flags: int = _ZIP_UTF8_FLAG) -> dict:
+    st = os.stat(path)
+    dos_time, dos_date = _zip_dos_datetime(st.st_mtime)
+    return {'path': path, 'name': arcname.replace(os.sep, '/'), 'method': method, 'flags': flags,
+            'time': dos_time, 'date': dos_date, 'crc': 0, 'size': st.st_size,
+            'compressed_size': st.st_size, 'offset': 0}
+
+
+def _deflate_file(path: str, out_path: str):
+    crc = 0
+    size = 0
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    with open(path, 'rb') as src, open(out_path, 'wb') as dst:
+        while True:
+            chunk = src.read(_ZIP_COPY_CHUNK)
+            if not chunk:
+                break
+            size += len(chunk)
+            crc = zlib.crc32(chunk, crc)
+            dst.write(compressor.compress(chunk))
+        dst.write(compressor.flush())
+        return crc, size, dst.tell()
+
+
+def collect_zip_sources(target: str, save_path: str) -> list:
+    if os.path.isfile(target):
+        return [(target, os.path.basename(target))]
+    
+    root_dir = target if os.path.isdir(target) else save_path
+    sources = []
+    for root, dirs, files in os.walk(root_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for file in sorted(files):
+            if file.startswith('.') or (root_dir == save_path and file.endswith('.zip')):
+                continue
+            file_path = os.path.join(root, file)
+            sources.append((file_path, os.path.relpath(file_path, root_dir)))
+    return sources
+
+
+class ZipArchiver:
+    
+    def __init__(self, status_callback: Optional[Callable] = None, workers: int = ZIP_WORKERS):
+        self.status_callback = status_callback
+        self.workers = max(1, workers)
+    
+    def log(self, msg: str, style: str = 'info'):
+        if self.status_callback:
+            self.status_callback(msg, style)
+        else:
+            logger.info(msg)
+    
+    def _method_for(self, path: str) -> int:
+        if os.path.splitext(path)[1].lower() in ZIP_STORED_EXTENSIONS:
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+    
+    def _copy_stored(self, entry: dict, out):
+        crc = 0
+        with open(entry['path'], 'rb') as src:
+            while True:
+                chunk = src.read(_ZIP_COPY_CHUNK)
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                out.write(chunk)
+        return crc
+    
+    def _write_entry(self, entry: dict, out, future, part_path: Optional[str]):
+        entry['offset'] = out.tell()
+        if future is None:
+            out.write(_zip_local_header(entry))
+            entry['crc'] = self._copy_stored(entry, out)
+            end = out.tell()
+            out.seek(entry['offset'])
+            out.write(_zip_local_header(entry))
+            out.seek(end)
+            return
+        
+        try:
+            entry['crc'], entry['size'], entry['compressed_size'] = future.result()
+            if entry['compressed_size'] >= entry['size']:
+                entry['method'] = zipfile.ZIP_STORED
+                entry['compressed_size'] = entry['size']
+                self._write_entry(entry, out, None, None)
+                return
+            out.write(_zip_local_header(entry))
+            with open(part_path, 'rb') as src:
+                shutil.copyfileobj(src, out, _ZIP_COPY_CHUNK)
+        finally:
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+    
+    def create(self, sources: list, zip_path: str) -> int:
+        entries = [_zip_entry(path, arcname, self._method_for(path)) for path, arcname in sources]
+        stored = sum(1 for e in entries if e['method'] == zipfile.ZIP_STORED)
+        self.log(f'🗜️ Zipping {len(entries)} files ({stored} stored as-is, {self.workers} workers)...', 'info')
+        
+        pending = collections.deque()
+        next_index = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as pool, open(zip_path, 'wb') as out:
+            try:
+                while next_index < len(entries) or pending:
+                    while next_index < len(entries) and len(pending) < self.workers * 2:
+                        entry = entries[next_index]
+                        future = part_path = None
+                        if entry['method'] == zipfile.ZIP_DEFLATED:
+                            part_path = f'{zip_path}.{next_index}.part'
+                            future = pool.submit(_deflate_file, entry['path'], part_path)
+                        pending.append((entry, future, part_path))
+                        next_index += 1
+                    
+                    entry, future, part_path = pending.popleft()
+                    self._write_entry(entry, out, future, part_path)
+            except BaseException:
+                for _, future, part_path in pending:
+                    if future is not None:
+                        future.cancel()
+                        try:
+                            future.result()
+                        except BaseException:
+                            pass
+                        try:
+                            os.remove(part_path)
+                        except OSError:
+                            pass
+                raise
+            
+            cd_offset = out.tell()
+            for entry in entries:
+                out.write(_zip_central_header(entry))
+            out.write(_zip_end_records(len(entries), cd_offset, out.tell() - cd_offset))
+        return len(entries)
+
+
+class ZipStream(io.RawIOBase):
+    
+    def __init__(self, sources: list):
+        super().__init__()
+        self._segments = []
+        self._entries = []
+        offset = 0
+        for path, arcname in sources:
+            entry = _zip_entry(path, arcname, zipfile.ZIP_STORED, _ZIP_UTF8_FLAG | _ZIP_DESCRIPTOR_FLAG)
+            entry['offset'] = offset
+            entry['crc_pos'] = 0
+            header = _zip_local_header(entry)
+            for kind, length, payload in (('bytes', len(header), header), ('data', entry['size'], entry),
+                                          ('descriptor', 24, entry)):
+                if length:
+                    self._segments.append((offset, length, kind, payload))
+                    offset += length
+            self._entries.append(entry)
+        
+        self._cd_offset = offset
+        self._cd_size = sum(len(_zip_central_header(e)) for e in self._entries)
+        tail_size = self._cd_size + len(_zip_end_records(0, 0, 0))
+        self._segments.append((offset, tail_size, 'tail', None))
+        self._starts = [segment[0] for segment in self._segments]
+        self.size = offset + tail_size
+        self._tail = None
+        self._pos = 0
+        self._file = None
+        self._file_path = None
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._pos
+    
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError(f'negative seek position {offset}')
+        self._pos = offset
+        return self._pos
+    
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+        super().close()
+    
+    def _read_file(self, entry: dict, offset: int, length: int) -> bytes:
+        if self._file_path != entry['path']:
+            if self._file:
+                self._file.close()
+            self._file = open(entry['path'], 'rb')
+            self._file_path = entry['path']
+        self._file.seek(offset)
+        data = self._file.read(length)
+        if len(data) != length:
+            raise OSError(f"{entry['path']} changed while zipping")
+        
+        if offset <= entry['crc_pos'] < offset + length:
+            entry['crc'] = zlib.crc32(data[entry['crc_pos'] - offset:], entry['crc'])
+            entry['crc_pos'] = offset + length
+        return data
+    
+    def _ensure_crc(self, entry: dict):
+        while entry['crc_pos'] < entry['size']:
+            self._read_file(entry, entry['crc_pos'], min(_ZIP_COPY_CHUNK, entry['size'] - entry['crc_pos']))
+    
+    def _segment_bytes(self, kind: str, payload, offset: int, length: int) -> bytes:
+        if kind == 'bytes':
+            return payload[offset:offset + length]
+        if kind == 'data':
+            return self._read_file(payload, offset, length)
+        if kind == 'descriptor':
+            self._ensure_crc(payload)
+            return _zip_data_descriptor(payload)[offset:offset + length]
+        
+        if self._tail is None:
+            for entry in self._entries:
+                self._ensure_crc(entry)
+            self._tail = (b''.join(_zip_central_header(e) for e in self._entries) +
+                          _zip_end_records(len(self._entries), self._cd_offset, self._cd_size))
+        return self._tail[offset:offset + length]
+    
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast('B')
+        written = 0
+        while written < len(view) and self._pos < self.size:
+            index = bisect.bisect_right(self._starts, self._pos) - 1
+            start, length, kind, payload = self._segments[index]
+            offset = self._pos - start
+            chunk = self._segment_bytes(kind, payload, offset, min(len(view) - written, length - offset))
+            view[written:written + len(chunk)] = chunk
+            written += len(chunk)
+            self._pos += len(chunk)
+        return written
+
+
+class TorrentStreamer:
+    
+    def __init__(self, handle, save_path: str, host: str = '127.0.0.1', port: int = STREAM_PORT,
+                 readahead: int = STREAM_READAHEAD_PIECES):
+        self.handle = handle
+        self.host = host
+        self.port = port
+        self.readahead = readahead
+        self.dispatcher = get_alert_dispatcher()
+        self.torrent_info = handle.torrent_file()
+        files = self.torrent_info.files()
+        self.files = [(files.file_path(i), files.file_size(i)) for i in range(files.num_files())]
+        self.save_path = save_path
+        self._key = _info_hash_key(handle)
+        self._cond = threading.Condition()
+        self._buffers = collections.OrderedDict()
+        self._requested = set()
+        self._complete = set()
+        self._stopped = False
+        self._server = None
+    
+    def start(self) -> 'TorrentStreamer':
+        streamer = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                streamer._serve(self, body=False)
+            
+            def do_GET(self):
+                streamer._serve(self, body=True)
+            
+            def log_message(self, fmt, *args):
+                logger.debug(fmt % args)
+        
+        self.dispatcher.subscribe(self._key, self._on_event)
+        progress = self.handle.file_progress(getattr(lt.torrent_handle, 'piece_granularity', 1))
+        self._complete = {i for i, (_, size) in enumerate(self.files) if progress[i] >= size}
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name='torrent_stream', daemon=True).start()
+        return self
+    
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self.dispatcher.unsubscribe(self._key, self._on_event)
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+    
+    def url(self, file_index: int) -> str:
+        return f'http://{self.host}:{self.port}/{file_index}'
+    
+    def _on_event(self, event: str, alert):
+        if event == 'piece_finished':
+            with self._cond:
+                self._cond.notify_all()
+        elif event == 'file_completed':
+            self._complete.add(alert.index)
+        elif event == 'read_piece':
+            with self._cond:
+                self._requested.discard(alert.piece)
+                if not alert.error.value():
+                    self._buffers[alert.piece] = bytes(alert.buffer)
+                    while len(self._buffers) > STREAM_BUFFER_PIECES:
+                        self._buffers.popitem(last=False)
+                self._cond.notify_all()
+    
+    def _live(self) -> bool:
+        return not self._stopped and self.handle.is_valid()
+    
+    def _prioritize(self, piece: int, last_piece: int):
+        for i, p in enumerate(range(piece, min(piece + self.readahead, last_piece + 1))):
+            if not self.handle.have_piece(p):
+                self.handle.set_piece_deadline(p, i * STREAM_DEADLINE_STEP_MS)
+    
+    def _read_piece(self, piece: int) -> Optional[bytes]:
+        with self._cond:
+            while self._live():
+                if piece in self._buffers:
+                    self._buffers.move_to_end(piece)
+                    return self._buffers[piece]
+                if self.handle.have_piece(piece) and piece not in self._requested:
+                    self._requested.add(piece)
+                    self.handle.read_piece(piece)
+                self._cond.wait(1)
+        return None
+    
+    def _read_disk(self, file_index: int, start: int, end: int):
+        with open(os.path.join(self.save_path, self.files[file_index][0]), 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+    
+    def iter_range(self, file_index: int, start: int, end: int):
+        last_piece = self.torrent_info.map_file(file_index, self.files[file_index][1] - 1, 1).piece
+        pos = start
+        while pos <= end and not self._stopped:
+            if not self._live():
+                # Pieces that never arrived are zero-filled on disk, so only finished files are served from it
+                if file_index in self._complete:
+                    yield from self._read_disk(file_index, pos, end)
+                return
+            req = self.torrent_info.map_file(file_index, pos, 1)
+            self._prioritize(req.piece, last_piece)
+            data = self._read_piece(req.piece)
+            if data is None:
+                continue
+            chunk = data[req.start:req.start + end - pos + 1]
+            if not chunk:
+                return
+            pos += len(chunk)
+            yield chunk
+    
+    def _parse_range(self, header: Optional[str], size: int):
+        if not header or not header.startswith('bytes='):
+            return 0, size - 1, False
+        first, _, last = header[6:].split(',')[0].strip().partition('-')
+        if not first:
+            return max(0, size - int(last)), size - 1, True
+        return int(first), min(int(last), size - 1) if last else size - 1, True
+    
+    def _serve(self, request: BaseHTTPRequestHandler, body: bool):
+        path = request.path.strip('/')
+        if not path:
+            links = ''.join(f'<li><a href="/{i}">{html.escape(name)}</a> ({size / (1024**2):.0f} MB)</li>'
+                            for i, (name, size) in enumerate(self.files))
+            payload = f'<html><body><ul>{links}</ul></body></html>'.encode('utf-8')
+            request.send_response(200)
+            request.send_header('Content-Type', 'text/html; charset=utf-8')
+            request.send_header('Content-Length', str(len(payload)))
+            request.end_headers()
+            if body:
+                request.wfile.write(payload)
+            return
+        
+        try:
+            file_index = int(path)
+            name, size = self.files[file_index]
+            start, end, partial = self._parse_range(request.headers.get('Range'), size)
+        except (ValueError, IndexError):
+            request.send_error(404)
+            return
+        if not self._live() and file_index not in self._complete:
+            request.send_error(404, 'Download stopped before this file finished')
+            return
+        if size == 0 or start > end or start >= size:
+            request.send_response(416)
+            request.send_header('Content-Range', f'bytes */{size}')
+            request.end_headers()
+            return
+        
+        request.send_response(206 if partial else 200)
+        request.send_header('Content-Type', mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        request.send_header('Accept-Ranges', 'bytes')
+        request.send_header('Content-Length', str(end - start + 1))
+        if partial:
+            request.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        request.end_headers()
+        if not body:
+            return
+        try:
+            for chunk in self.iter_range(file_index, start, end):
+                request.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
 class TorrentDownloader:
     
     def __init__(self, progress_callback: Optional[Callable] = None, 
-                 status_callback: Optional[Callable] = None):
+                 status_callback: Optional[Callable] = None,
+                 file_progress_callback: Optional[Callable] = None,
+                 file_completed_callback: Optional[Callable] = None):
         self.progress_callback = progress_callback
         self.status_callback = status_callback
+        self.file_progress_callback = file_progress_callback
+        self.file_completed_callback = file_completed_callback
         self.session = get_global_session()
+        self.dispatcher = get_alert_dispatcher()
+        self.metadata_cache = MetadataCache()
+        self.resume_store = ResumeStore()
+        self.peer_cache = PeerCache()
+        self.streamer = None
         self.handle = None
         self.should_stop = False
         self.timeout_s = 900
         self._stop_event = threading.Event()
         self._log_lock = threading.Lock()
         self._torrent_lock = threading.Lock()
+        self._events = None
+        self._event_key = None
+        self._analyzed_handle = None
+        self._analyzed_key = None
+        self._analyzed_timer = None
+        self._analyzed_lock = threading.Lock()
+        self._resume_enabled = False
+        self._resume_saved = threading.Event()
+        self._last_resume_save = 0.0
     
     def _handle_error(self, error: Exception, context: str = "") -> bool:
         if isinstance(error, (lt.LibtorrentError, RuntimeError)):
@@ -175,16 +1654,179 @@ class TorrentDownloader:
     def _add_trackers_to_magnet(self, magnet_link: str, add_trackers: bool) -> str:
         if not add_trackers:
             return magnet_link
-        trackers_to_add = [t for t in PUBLIC_TRACKERS if t not in magnet_link]
+        present = {_normalize_tracker(t) for t in parse_qs(urlparse(magnet_link).query).get('tr', [])}
+        trackers_to_add = [t for t in get_tracker_registry().ranked() if _normalize_tracker(t) not in present]
         if trackers_to_add:
             tracker_params = '&tr='.join([''] + [quote(t, safe='/:?=&') for t in trackers_to_add])
             return magnet_link + tracker_params
         return magnet_link
     
-    def analyze_torrent(self, magnet_link: str, add_trackers: bool = True):
+    def _subscribe(self, params):
+        self._unsubscribe()
+        self._events = queue.Queue()
+        self._event_key = _info_hash_key(params)
+        self.dispatcher.subscribe(self._event_key, self._on_event)
+    
+    def _unsubscribe(self):
+        if self._event_key is not None:
+            self.dispatcher.unsubscribe(self._event_key, self._on_event)
+            self._event_key = None
+    
+    def _on_event(self, event: str, payload):
+        if event == 'save_resume_data':
+            self.resume_store.save(_info_hash_key(payload.handle), payload.params)
+            self._resume_saved.set()
+        elif event == 'save_resume_data_failed':
+            self._resume_saved.set()
+        
+        events = self._events
+        if events is not None:
+            events.put((event, payload))
+    
+    def _next_event(self, timeout: Optional[float]):
+        if self._stop_event.is_set():
+            return 'stop', None
+        try:
+            return self._events.get(timeout=timeout)
+        except queue.Empty:
+            return None, None
+    
+    def _load_cached_metadata(self, params) -> bool:
+        torrent_info = self.metadata_cache.load(_info_hash_key(params))
+        if torrent_info is None:
+            return False
+        params.ti = torrent_info
+        self.log('⚡ Metadata loaded from cache', 'info')
+        return True
+    
+    def _store_metadata(self):
+        torrent_info = self.handle.torrent_file()
+        if torrent_info:
+            self.metadata_cache.store(_info_hash_key(self.handle), torrent_info)
+    
+    def _save_resume(self, wait: bool = False):
+        if not self.handle or not self.handle.is_valid() or not self.handle.need_save_resume_data():
+            return
+        self._resume_saved.clear()
+        self.handle.save_resume_data(lt.save_resume_flags_t.flush_disk_cache | lt.save_resume_flags_t.save_info_dict)
+        self._last_resume_save = time.monotonic()
+        if wait and not self._resume_saved.wait(RESUME_SAVE_TIMEOUT_SECONDS):
+            logger.warning("Timed out waiting for resume data")
+    
+    def _maybe_save_resume(self):
+        if self._resume_enabled and time.monotonic() - self._last_resume_save >= RESUME_SAVE_INTERVAL_SECONDS:
+            self._save_resume()
+    
+    def _finish_resume(self):
+        self._resume_enabled = False
+        self.resume_store.remove(_info_hash_key(self.handle))
+    
+    def _set_upload_mode(self, enabled: bool):
+        if enabled:
+            self.handle.set_flags(lt.torrent_flags.upload_mode)
+        else:
+            self.handle.unset_flags(lt.torrent_flags.upload_mode)
+    
+    def _park_analyzed(self):
+        with self._analyzed_lock:
+            self._analyzed_handle = self.handle
+            self._analyzed_key = _info_hash_key(self.handle)
+            self._analyzed_timer = threading.Timer(HANDLE_IDLE_EXPIRY_SECONDS, self.release_analyzed)
+            self._analyzed_timer.daemon = True
+            self._analyzed_timer.start()
+        self.handle = None
+    
+    def _claim_analyzed(self, info_hash: str):
+        with self._analyzed_lock:
+            handle, key = self._analyzed_handle, self._analyzed_key
+            if handle is None or key != info_hash or not handle.is_valid():
+                handle = None
+            else:
+                self._analyzed_timer.cancel()
+                self._analyzed_handle = self._analyzed_key = self._analyzed_timer = None
+        if handle is None:
+            self.release_analyzed()
+        return handle
+    
+    def release_analyzed(self):
+        with self._analyzed_lock:
+            handle, timer = self._analyzed_handle, self._analyzed_timer
+            self._analyzed_handle = self._analyzed_key = self._analyzed_timer = None
+        if timer:
+            timer.cancel()
+        if handle and handle.is_valid():
+            try:
+                self.session.remove_torrent(handle)
+                logger.info("Analyzed torrent handle released")
+            except Exception as e:
+                logger.error(f"Error releasing analyzed handle: {e}")
+    
+    def _race_metadata_sources(self):
+        key = _info_hash_key(self.handle)
+        cached_peers = self.peer_cache.load(key)
+        for peer in cached_peers:
+            try:
+                self.handle.connect_peer(peer, 16)
+            except Exception:
+                pass
+        try:
+            self.handle.force_reannounce()
+            self.handle.force_dht_announce()
+        except Exception as e:
+            logger.warning(f"Forced announce failed: {e}")
+        if cached_peers:
+            self.log(f'👥 Trying {len(cached_peers)} known peers', 'info')
+    
+    def _remember_peers(self):
+        try:
+            peers = [tuple(p.ip) for p in self.handle.get_peer_info() if p.ip and p.ip[1]]
+            self.peer_cache.store(_info_hash_key(self.handle), peers)
+        except Exception as e:
+            logger.warning(f"Could not record peers: {e}")
+    
+    def _sample_peer_sources(self, first_seen: dict, elapsed: float):
+        try:
+            for peer in self.handle.get_peer_info():
+                for bit, name in PEER_SOURCES:
+                    if peer.source & bit and name not in first_seen:
+                        first_seen[name] = elapsed
+        except Exception:
+            pass
+    
+    def _wait_for_metadata(self, report_every: int = 0) -> Optional[bool]:
+        if self.handle.status().has_metadata:
+            return True
+        
+        self._race_metadata_sources()
+        started = time.monotonic()
+        next_report = report_every
+        first_seen = {}
+        while True:
+            elapsed = time.monotonic() - started
+            if elapsed >= self.timeout_s:
+                return False
+            wait = self.timeout_s - elapsed
+            if report_every:
+                wait = min(wait, max(0, next_report - elapsed))
+            
+            event, _ = self._next_event(wait)
+            if event == 'stop':
+                return None
+            self._sample_peer_sources(first_seen, time.monotonic() - started)
+            if event == 'metadata_received':
+                get_metrics().observe('metadata_fetch_seconds', time.monotonic() - started)
+                sources = ', '.join(f'{name} {t:.1f}s' for name, t in sorted(first_seen.items(), key=lambda i: i[1]))
+                self.log(f'📡 Metadata in {time.monotonic() - started:.1f}s' + (f' (first peers: {sources})' if sources else ''), 'info')
+                return True
+            if report_every and time.monotonic() - started >= next_report:
+                self.log(f'  Waiting... {next_report}s', 'info')
+                next_report += report_every
+    
+    def analyze_torrent(self, magnet_link: str, add_trackers: bool = True, keep_handle: bool = False):
         try:
             self.should_stop = False
             self._stop_event.clear()
+            self.release_analyzed()
             self.log('🔧 Initializing engine...', 'info')
             
             if add_trackers:
@@ -196,25 +1838,35 @@ class TorrentDownloader:
                 self.log(f'❌ Invalid magnet link format: {str(e)}', 'error')
                 return None
             
-            params.save_path = '/tmp'
+            # A kept handle is reused by download(), so it must carry any fast-resume state and its real save path
+            resumed = self.resume_store.load(_info_hash_key(params)) if keep_handle else None
+            if resumed is not None:
+                self.log('⏯️ Found saved download state', 'info')
+                resumed.trackers = list(dict.fromkeys(list(resumed.trackers) + list(params.trackers)))
+                resumed.flags &= ~lt.torrent_flags.paused
+                params = resumed
+            else:
+                params.save_path = '/tmp'
+            if keep_handle:
+                params.flags |= lt.torrent_flags.upload_mode
+            cached = (resumed is not None and resumed.ti is not None) or self._load_cached_metadata(params)
+            self._subscribe(params)
             self.handle = self.session.add_torrent(params)
             
             self.log('📡 Fetching metadata...', 'info')
             
-            timeout = 0
-            while not self.handle.status().has_metadata and timeout < self.timeout_s:
-                if self._stop_event.wait(1):
-                    self.log('⚠️ Stopped', 'warning')
-                    return None
-                timeout += 1
-                if timeout % 10 == 0:
-                    self.log(f'  Waiting... {timeout}s', 'info')
+            has_metadata = self._wait_for_metadata(report_every=10)
+            if has_metadata is None:
+                self.log('⚠️ Stopped', 'warning')
+                return None
             
             status = self.handle.status()
-            if not status.has_metadata:
+            if not has_metadata:
                 self.log('❌ Metadata fetch timeout', 'error')
                 self.should_stop = True
                 return None
+            if not cached:
+                self._store_metadata()
             
             torrent_info = self.handle.torrent_file()
             if not torrent_info:
@@ -242,7 +1894,10 @@ class TorrentDownloader:
             self.log(f'✅ {torrent_name}', 'success')
             self.log(f'📦 {total_size/(1024**3):.2f} GB, {len(file_list)} files', 'info')
             
-            self.handle.pause()
+            if keep_handle:
+                self._park_analyzed()
+            else:
+                self.handle.pause()
             
             return {
                 'name': torrent_name,
@@ -255,11 +1910,15 @@ class TorrentDownloader:
         finally:
             self._cleanup_handle()
     
-    def download(self, magnet_link: str, save_path: str, add_trackers: bool = True, 
-                 auto_zip: bool = False, selected_files: list = None) -> bool:
+    def download(self, magnet_link: str, save_path: str, add_trackers: bool = True,
+                 auto_zip: bool = False, selected_files: list = None,
+                 pipeline: Optional['StreamingUploadPipeline'] = None, stream: bool = False,
+                 file_order: Optional[list] = None) -> bool:
+        completed = False
         try:
             self.should_stop = False
             self._stop_event.clear()
+            started = time.monotonic()
             self.log('🔧 Starting download engine...', 'info')
             
             if add_trackers:
@@ -271,24 +1930,40 @@ class TorrentDownloader:
                 self.log(f'❌ Invalid magnet link format: {str(e)}', 'error')
                 return False
             
-            params.save_path = save_path
-            
-            self.handle = self.session.add_torrent(params)
+            reused = self._claim_analyzed(_info_hash_key(params))
+            self._subscribe(params)
+            if reused is not None:
+                self.handle = reused
+                cached = True
+                self.log('♻️ Reusing analyzed torrent and its peers', 'info')
+                if os.path.abspath(self.handle.status().save_path) != os.path.abspath(save_path):
+                    self.handle.move_storage(save_path)
+            else:
+                resumed = self.resume_store.load(_info_hash_key(params))
+                if resumed is not None:
+                    self.log('⏯️ Resuming from saved state', 'info')
+                    params = resumed
+                    params.flags &= ~(lt.torrent_flags.paused | lt.torrent_flags.upload_mode)
+                params.save_path = save_path
+                cached = (resumed is not None and resumed.ti is not None) or self._load_cached_metadata(params)
+                self.handle = self.session.add_torrent(params)
+            self._resume_enabled = True
+            self._last_resume_save = time.monotonic()
             
             self.log('📡 Getting metadata...', 'info')
             
-            timeout = 0
-            while not self.handle.status().has_metadata and timeout < self.timeout_s:
-                if self._stop_event.wait(1):
-                    self.log('⚠️ Stopped', 'warning')
-                    return False
-                timeout += 1
+            has_metadata = self._wait_for_metadata()
+            if has_metadata is None:
+                self.log('⚠️ Stopped', 'warning')
+                return False
             
             status = self.handle.status()
-            if not status.has_metadata:
+            if not has_metadata:
                 self.log('❌ Metadata timeout', 'error')
                 self.should_stop = True
                 return False
+            if not cached:
+                self._store_metadata()
             
             self.log(f'✅ {status.name}', 'success')
             
@@ -309,7 +1984,8 @@ class TorrentDownloader:
                         selected_size = sum(files.file_size(i) for i in selected_files if 0 <= i < num_files)
                         
                         free_gb = shutil.disk_usage(save_path).free / (1024**3)
-                        needed_gb = selected_size / (1024**3) * 1.1
+                        largest = max((files.file_size(i) for i in selected_files if 0 <= i < num_files), default=0)
+                        needed_gb = self._disk_needed(selected_size, pipeline, auto_zip, largest) / (1024**3) * 1.1
                         
                         if free_gb < needed_gb:
                             self.log(f'❌ Insufficient disk space: need {needed_gb:.1f}GB, have {free_gb:.1f}GB', 'error')
@@ -320,7 +1996,8 @@ class TorrentDownloader:
                     else:
                         total_wanted = status.total_wanted
                         free_gb = shutil.disk_usage(save_path).free / (1024**3)
-                        needed_gb = total_wanted / (1024**3) * 1.1
+                        largest = max((files.file_size(i) for i in range(num_files)), default=0)
+                        needed_gb = self._disk_needed(total_wanted, pipeline, auto_zip, largest) / (1024**3) * 1.1
                         
                         if free_gb < needed_gb:
                             self.log(f'❌ Insufficient disk space: need {needed_gb:.1f}GB, have {free_gb:.1f}GB', 'error')
@@ -331,30 +2008,61 @@ class TorrentDownloader:
                 else:
                     self.log(f'📦 {status.total_wanted/(1024**3):.2f} GB', 'info')
             
+            self._set_upload_mode(False)
+            if file_order and torrent_info and pipeline is None:
+                self._apply_file_order(file_order, selected_files, torrent_info.files().num_files())
+            if stream and torrent_info:
+                self._start_streaming(save_path, selected_files)
+            
+            if pipeline is not None:
+                if not torrent_info:
+                    self.log('❌ No torrent info', 'error')
+                    return False
+                if auto_zip:
+                    self.log('⚠️ Auto-zip is skipped when streaming to Drive', 'warning')
+                if pipeline.waves:
+                    return self._download_waves(torrent_info, save_path, selected_files, pipeline, file_order)
+                return self._download_streaming(torrent_info, save_path, selected_files, pipeline, file_order)
+            
             self.log('⬇️ Downloading...', 'info')
             
-            while not status.is_seeding:
-                if self._stop_event.wait(2):
+            status = self.handle.status()
+            while not status.is_finished:
+                event, payload = self._next_event(EVENT_FALLBACK_SECONDS)
+                if event == 'stop':
                     self.log('⚠️ Stopped', 'warning')
                     return False
+                self._maybe_save_resume()
+                if event == 'file_completed':
+                    self._on_file_completed(payload.index, save_path)
+                    continue
+                if event != 'state_update':
+                    if event in (None, 'torrent_finished'):
+                        status = self.handle.status()
+                    continue
                 
-                status = self.handle.status()
+                status = payload
                 progress = status.progress * 100
                 speed_down = status.download_rate / 1024
                 speed_up = status.upload_rate / 1024
                 peers = status.num_peers
                 
-                remaining = status.total_wanted - status.total_wanted_done
-                if status.download_rate > 0:
-                    eta_seconds = remaining / status.download_rate
-                    eta_minutes = int(eta_seconds / 60)
-                    eta = f'{eta_minutes}m' if eta_minutes > 0 else '<1m'
-                else:
-                    eta = '∞'
-                
-                self.update_progress(progress, speed_down, speed_up, peers, eta)
+                self.update_progress(progress, speed_down, speed_up, peers, self._format_eta(status))
+                self._report_file_progress()
             
+            self._report_file_progress()
             self.log('🎉 Download complete!', 'success')
+            completed = True
+            self._finish_resume()
+            if torrent_info:
+                files = torrent_info.files()
+                wanted = range(files.num_files()) if selected_files is None else selected_files
+                get_inventory().record_torrent(_info_hash_key(self.handle), status.name, save_path,
+                                               [files.file_path(i) for i in wanted if 0 <= i < files.num_files()])
+            elapsed = time.monotonic() - started
+            get_metrics().summary({'type': 'download', 'name': status.name, 'bytes': status.total_wanted,
+                                   'seconds': round(elapsed, 1), 'bytes_per_second': status.total_wanted / max(elapsed, 1e-3),
+                                   'peers': status.num_peers})
             
             if auto_zip:
                 self.log('🗜️ Creating zip...', 'info')
@@ -364,25 +2072,11 @@ class TorrentDownloader:
                 zip_output = os.path.join(save_path, f'{zip_base}.zip')
                 
                 try:
-                    if os.path.isdir(target):
-                        shutil.make_archive(os.path.join(save_path, zip_base), 'zip', target)
-                    elif os.path.isfile(target):
-                        with zipfile.ZipFile(zip_output, 'w', zipfile.ZIP_DEFLATED) as zf:
-                            zf.write(target, os.path.basename(target))
-                    else:
-                        for root, dirs, files in os.walk(save_path):
-                            for file in files:
-                                if not file.endswith('.zip') and not file.startswith('.'):
-                                    file_path = os.path.join(root, file)
-                                    arcname = os.path.relpath(file_path, save_path)
-                                    with zipfile.ZipFile(zip_output, 'a', zipfile.ZIP_DEFLATED) as zf:
-                                        zf.write(file_path, arcname)
-                    
+                    archiver = ZipArchiver(self.log)
+                    archiver.create(collect_zip_sources(target, save_path), zip_output)
                     self.log(f'✅ Zip: {zip_base}.zip', 'success')
                 except OSError as e:
                     self.log(f'⚠️ Zip I/O error: {e}', 'warning')
-                except zipfile.BadZipFile as e:
-                    self.log(f'⚠️ Zip creation failed: {e}', 'warning')
                 except Exception as e:
                     self.log(f'⚠️ Zip error: {e}', 'warning')
             
@@ -391,21 +2085,444 @@ class TorrentDownloader:
         except Exception as e:
             return self._handle_error(e, "download")
         finally:
+            # A finished download keeps serving its files from disk until the next stream or downloader
+            if not completed:
+                self.stop_streaming()
             self._cleanup_handle()
     
-    def _cleanup_handle(self):
-        if self.handle and self.handle.is_valid():
+    def _recover_file_error(self, alert, save_path: str, submitted: set, pipeline: 'StreamingUploadPipeline') -> bool:
+        index = getattr(alert, 'index', -1)
+        message = alert.error.message() if hasattr(alert, 'error') else alert.message()
+        files = self.handle.torrent_file().files()
+        path = os.path.join(save_path, files.file_path(index)) if 0 <= index < files.num_files() else None
+        if index in submitted and pipeline.delete_after_upload and path and not os.path.exists(path):
+            # A peer asked for a piece of a file that was already uploaded and deleted
+            logger.info(f"Ignoring file error on uploaded file {path}: {message}")
+            self.handle.clear_error()
+            self.handle.resume()
+            return True
+        logger.error(f"File error on {path or index}: {message}")
+        self.log(f'❌ File error on {path or f"file {index}"}: {message}', 'error')
+        pipeline.failed = True
+        return False
+    
+    def _disk_needed(self, wanted_size: int, pipeline: Optional['StreamingUploadPipeline'], auto_zip: bool = False,
+                     largest_file: int = 0) -> int:
+        if pipeline is not None:
+            # can_admit() lets a single file bigger than the window in on its own
+            window = max(pipeline.window_bytes, largest_file)
+            return min(wanted_size, window) if pipeline.delete_after_upload else wanted_size
+        # The local zip is written next to the payload, so the payload is needed twice
+        return wanted_size * 2 if auto_zip else wanted_size
+    
+    def _format_eta(self, status) -> str:
+        remaining = status.total_wanted - status.total_wanted_done
+        if status.download_rate > 0:
+            eta_seconds = remaining / status.download_rate
+            eta_minutes = int(eta_seconds / 60)
+            return f'{eta_minutes}m' if eta_minutes > 0 else '<1m'
+        return '∞'
+    
+    def _download_streaming(self, torrent_info, save_path: str, selected_files: Optional[list],
+                            pipeline: 'StreamingUploadPipeline', file_order: Optional[list] = None) -> bool:
+        files = torrent_info.files()
+        num_files = files.num_files()
+        wanted = range(num_files) if selected_files is None else selected_files
+        pending = [i for i in wanted if 0 <= i < num_files and files.file_size(i) > 0]
+        if file_order:
+            rank = {idx: r for r, idx in enumerate(file_order)}
+            pending.sort(key=lambda i: rank.get(i, len(rank)))
+        
+        progress = self._file_progress()
+        completed = {i for i in pending if progress[i] >= files.file_size(i)}
+        priorities = [0] * num_files
+        admitted = []
+        submitted = set()
+        
+        def admit() -> bool:
+            changed = False
+            while pending and pipeline.can_admit(files.file_size(pending[0])):
+                idx = pending.pop(0)
+                pipeline.reserve(files.file_size(idx))
+                priorities[idx] = 7
+                admitted.append(idx)
+                changed = True
+            return changed
+        
+        admit()
+        self.handle.prioritize_files(priorities)
+        self.handle.set_sequential_download(True)
+        pipeline.start()
+        
+        self.log(f'⬇️ Streaming to Drive ({pipeline.window_bytes/(1024**3):.1f} GB window)...', 'info')
+        
+        while admitted or pending:
+            event, payload = self._next_event(0.5)
+            if event == 'stop':
+                pipeline.close(wait=False)
+                self.log('⚠️ Stopped', 'warning')
+                return False
+            
+            if pipeline.failed:
+                pipeline.close(wait=False)
+                self.log('❌ Streaming upload failed', 'error')
+                return False
+            
+            self._maybe_save_resume()
+            if event == 'file_completed':
+                completed.add(payload.index)
+                self._on_file_completed(payload.index, save_path)
+            elif event == 'file_error':
+                if not self._recover_file_error(payload, save_path, submitted, pipeline):
+                    pipeline.close(wait=False)
+                    return False
+            elif event == 'state_update':
+                self.update_progress(payload.progress * 100, payload.download_rate / 1024,
+                                     payload.upload_rate / 1024, payload.num_peers, self._format_eta(payload))
+                self._report_file_progress()
+            
+            changed = False
+            for idx in list(admitted):
+                if idx in completed:
+                    admitted.remove(idx)
+                    priorities[idx] = 0
+                    changed = True
+                    submitted.add(idx)
+                    pipeline.submit(os.path.join(save_path, files.file_path(idx)), files.file_size(idx),
+                                    os.path.dirname(files.file_path(idx)))
+            
+            if admit() or changed:
+                self.handle.prioritize_files(priorities)
+        
+        self.log('🎉 Download complete, finishing uploads...', 'success')
+        if not pipeline.close():
+            self.log('❌ Streaming upload failed', 'error')
+            return False
+        self._finish_resume()
+        
+        self.log(f'✅ Streamed {pipeline.uploaded} files to Drive', 'success')
+        return True
+    
+    def _apply_file_order(self, file_order: list, selected_files: Optional[list], num_files: int):
+        wanted = set(range(num_files) if selected_files is None else selected_files)
+        ordered = [i for i in file_order if i in wanted]
+        if not ordered:
+            return
+        priorities = list(self.handle.get_file_priorities())
+        for rank, idx in enumerate(ordered):
+            priorities[idx] = 7 - rank * 6 // len(ordered)
+        for idx in wanted - set(ordered):
+            priorities[idx] = 1
+        self.handle.prioritize_files(priorities)
+    
+    def _file_progress(self) -> list:
+        return self.handle.file_progress(getattr(lt.torrent_handle, 'piece_granularity', 1))
+    
+    def _report_file_progress(self):
+        if self.file_progress_callback:
+            try:
+                self.file_progress_callback(self._file_progress())
+            except Exception as e:
+                logger.warning(f"File progress callback failed: {e}")
+    
+    def _on_file_completed(self, index: int, save_path: str):
+        torrent_info = self.handle.torrent_file()
+        if not torrent_info:
+            return
+        path = os.path.join(save_path, torrent_info.files().file_path(index))
+        logger.info(f"File completed: {path}")
+        if self.file_completed_callback:
+            try:
+                self.file_completed_callback(index, path)
+            except Exception as e:
+                logger.error(f"File completed callback failed: {e}")
+    
+    def _start_streaming(self, save_path: str, selected_files: Optional[list]):
+        self.stop_streaming()
+        self.handle.set_sequential_download(True)
+        try:
+            self.streamer = TorrentStreamer(self.handle, save_path).start()
+        except OSError as e:
+            self.log(f'⚠️ Could not start stream server: {e}', 'warning')
+            return
+        wanted = range(len(self.streamer.files)) if selected_files is None else selected_files
+        for idx in list(wanted)[:10]:
+            self.log(f'▶️ {self.streamer.files[idx][0]}: {self.streamer.url(idx)}', 'info')
+    
+    def stop_streaming(self):
+        if self.streamer:
+            self.streamer.stop()
+            self.streamer = None
+    
+    def _plan_waves(self, pending: list, files, budget: int) -> list:
+        waves, current, current_size = [], [], 0
+        for idx in pending:
+            size = files.file_size(idx)
+            if current and current_size + size > budget:
+                waves.append(current)
+                current, current_size = [], 0
+            current.append(idx)
+            current_size += size
+        if current:
+            waves.append(current)
+        return waves
+    
+    def _download_waves(self, torrent_info, save_path: str, selected_files: Optional[list],
+                        pipeline: 'StreamingUploadPipeline', file_order: Optional[list] = None) -> bool:
+        files = torrent_info.files()
+        num_files = files.num_files()
+        wanted = range(num_files) if selected_files is None else selected_files
+        inventory = get_inventory()
+        pending = [i for i in wanted if 0 <= i < num_files and files.file_size(i) > 0 and
+                   not inventory.was_uploaded(os.path.join(save_path, files.file_path(i)), files.file_size(i),
+                                              pipeline.target_folder(os.path.dirname(files.file_path(i))))]
+        if file_order:
+            rank = {idx: r for r, idx in enumerate(file_order)}
+            pending.sort(key=lambda i: rank.get(i, len(rank)))
+        
+        waves = self._plan_waves(pending, files, pipeline.window_bytes)
+        total = sum(files.file_size(i) for i in pending)
+        largest = max((sum(files.file_size(i) for i in wave) for wave in waves), default=0)
+        free = shutil.disk_usage(save_path).free
+        if largest * 1.1 > free:
+            self.log(f'❌ Largest wave needs {largest * 1.1 / (1024**3):.1f}GB, have {free / (1024**3):.1f}GB', 'error')
+            return False
+        
+        self.log(f'🌊 {len(waves)} waves of up to {pipeline.window_bytes / (1024**3):.1f} GB '
+                 f'({total / (1024**3):.2f} GB, {len(wanted) - len(pending)} files already uploaded)', 'info')
+        pipeline.start()
+        done_bytes = 0
+        submitted = set()
+        for n, wave in enumerate(waves, 1):
+            wave_size = sum(files.file_size(i) for i in wave)
+            priorities = [0] * num_files
+            for idx in wave:
+                priorities[idx] = 7
+            self.handle.prioritize_files(priorities)
+            self.log(f'🌊 Wave {n}/{len(waves)}: {len(wave)} files, {wave_size / (1024**3):.2f} GB', 'info')
+            
+            progress = self._file_progress()
+            remaining = {i for i in wave if progress[i] < files.file_size(i)}
+            while remaining:
+                event, payload = self._next_event(EVENT_FALLBACK_SECONDS)
+                if event == 'stop':
+                    pipeline.close(wait=False)
+                    self.log('⚠️ Stopped', 'warning')
+                    return False
+                self._maybe_save_resume()
+                if event == 'file_completed':
+                    remaining.discard(payload.index)
+                    self._on_file_completed(payload.index, save_path)
+                elif event == 'file_error':
+                    if not self._recover_file_error(payload, save_path, submitted, pipeline):
+                        pipeline.close(wait=False)
+                        return False
+                elif event in ('state_update', None):
+                    progress = self._file_progress()
+                    remaining = {i for i in remaining if progress[i] < files.file_size(i)}
+                    if payload is not None:
+                        wave_done = sum(progress[i] for i in wave)
+                        self.update_progress((done_bytes + wave_done) / max(total, 1) * 100, payload.download_rate / 1024,
+                                             payload.upload_rate / 1024, payload.num_peers, self._format_eta(payload))
+            
+            self.log(f'⬆️ Uploading wave {n}/{len(waves)}...', 'info')
+            submitted.update(wave)
+            for idx in wave:
+                pipeline.reserve(files.file_size(idx))
+                pipeline.submit(os.path.join(save_path, files.file_path(idx)), files.file_size(idx),
+                                os.path.dirname(files.file_path(idx)))
+            pipeline.drain()
+            inventory.save(force=True)
+            if pipeline.failed:
+                pipeline.close(wait=False)
+                self.log(f'❌ Upload of wave {n} failed', 'error')
+                return False
+            done_bytes += wave_size
+        
+        if not pipeline.close():
+            self.log('❌ Wave upload failed', 'error')
+            return False
+        self._finish_resume()
+        self.log(f'✅ Uploaded {pipeline.uploaded} files in {len(waves)} waves', 'success')
+        return True
+    
+    def _cleanup_handle(self):
+        if self._resume_enabled:
+            self._resume_enabled = False
+            try:
+                self._save_resume(wait=True)
+            except Exception as e:
+                logger.error(f"Could not save resume data: {e}")
+        self._unsubscribe()
+        if self.handle and self.handle.is_valid():
+            self._remember_peers()
+            save_dht_state()
+            try:
+                self.handle.pause()
+                self.session.remove_torrent(self.handle)
+                logger.info("Torrent handle cleaned up")
+            except Exception as e:
+                logger.error(f"Error during cleanup: {e}")
+        self.handle = None
+    
+    def stop(self):
+        self.should_stop = True
+        self._stop_event.set()
+        self._on_event('stop', None)
+
+
+class UploadSessionStore:
+    
+    def __init__(self, path: str = os.path.join(STATE_DIR, 'upload_sessions.json')):
+        self.path = path
+        self._lock = threading.Lock()
+    
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._read().get(key)
+        if entry and time.time() - entry['saved'] < UPLOAD_SESSION_MAX_AGE_SECONDS:
+            return entry['uri']
+        return None
+    
+    def put(self, key: str, uri: str):
+        with self._lock:
+            sessions = self._read()
+            sessions[key] = {'uri': uri, 'saved': time.time()}
+            _atomic_write(self.path, sessions)
+    
+    def remove(self, key: str):
+        with self._lock:
+            sessions = self._read()
+            if sessions.pop(key, None) is not None:
+                _atomic_write(self.path, sessions)
+
+
+class HashingFile(io.RawIOBase):
+    
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._md5 = hashlib.md5()
+        self._hashed = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+    
+    def tell(self) -> int:
+        return self._file.tell()
+    
+    def readinto(self, buffer) -> int:
+        pos = self._file.tell()
+        n = self._file.readinto(buffer)
+        if n and pos <= self._hashed < pos + n:
+            self._md5.update(memoryview(buffer)[self._hashed - pos:n])
+            self._hashed = pos + n
+        return n
+    
+    def hexdigest(self) -> str:
+        if self._hashed < self.size:
+            pos = self._file.tell()
+            self._file.seek(self._hashed)
+            while True:
+                chunk = self._file.read(_ZIP_COPY_CHUNK)
+                if not chunk:
+                    break
+                self._md5.update(chunk)
+            self._hashed = self.size
+            self._file.seek(pos)
+        return self._md5.hexdigest()
+    
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+class HashCache:
+    
+    def __init__(self, path: str = os.path.join(STATE_DIR, 'md5_cache.json')):
+        self.path = path
+        self._hashes = None
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = 0.0
+    
+    def _key(self, file_path: str) -> str:
+        st = os.stat(file_path)
+        return f'{os.path.abspath(file_path)}:{st.st_size}:{st.st_mtime_ns}'
+    
+    def _load(self) -> dict:
+        if self._hashes is None:
             try:
-                self.handle.pause()
-                self.session.remove_torrent(self.handle)
-                logger.info("Torrent handle cleaned up")
-            except Exception as e:
-                logger.error(f"Error during cleanup: {e}")
-        self.handle = None
+                with open(self.path) as f:
+                    hashes = json.load(f)
+            except (OSError, ValueError):
+                hashes = {}
+            # Keys embed size and mtime, so rewritten or deleted files leave stale entries behind
+            self._hashes = {}
+            for key, md5 in hashes.items():
+                path = key.rsplit(':', 2)[0]
+                try:
+                    current = self._key(path)
+                except OSError:
+                    continue
+                if current == key:
+                    self._hashes[key] = md5
+                    self._keys[path] = key
+            self._dirty = len(self._hashes) != len(hashes)
+        return self._hashes
     
-    def stop(self):
-        self.should_stop = True
-        self._stop_event.set()
+    def get(self, file_path: str) -> Optional[str]:
+        with self._lock:
+            return self._load().get(self._key(file_path))
+    
+    def put(self, file_path: str, md5: str):
+        with self._lock:
+            hashes = self._load()
+            path = os.path.abspath(file_path)
+            key = self._key(path)
+            stale = self._keys.get(path)
+            if stale is not None and stale != key:
+                hashes.pop(stale, None)
+            hashes[key] = md5
+            self._keys[path] = key
+            self._dirty = True
+        self.save()
+    
+    def save(self, force: bool = False):
+        with self._lock:
+            if not self._dirty or (not force and time.monotonic() - self._last_save < HASH_CACHE_SAVE_INTERVAL_SECONDS):
+                return
+            data = json.dumps(self._hashes)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        _atomic_write(self.path, data)
+    
+    def compute(self, file_path: str) -> str:
+        md5 = self.get(file_path)
+        if md5 is None:
+            source = HashingFile(file_path)
+            try:
+                md5 = source.hexdigest()
+            finally:
+                source.close()
+            self.put(file_path, md5)
+        return md5
 
 
 class DriveUploader:
@@ -414,6 +2531,14 @@ class DriveUploader:
         self.progress_callback = progress_callback
         self.status_callback = status_callback
         self.service = None
+        self.credentials = None
+        self.sessions = UploadSessionStore()
+        self.hashes = HashCache()
+        self._local = threading.local()
+        self._folder_cache = {}
+        self._folder_lock = threading.Lock()
+        self._listings = {}
+        self._listing_users = 0
     
     def _handle_error(self, error: Exception, context: str) -> bool:
         logger.exception(f"{context} error: {error}")
@@ -429,68 +2554,843 @@ class DriveUploader:
     def authenticate(self) -> bool:
         try:
             self.log('🔐 Authenticating...', 'info')
-            from google.colab import auth
+            install_dependencies(libtorrent=False)
             import google.auth
-            from googleapiclient.discovery import build
             
-            auth.authenticate_user()
-            creds, _ = google.auth.default()
-            self.service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+            if IN_COLAB:
+                from google.colab import auth
+                auth.authenticate_user()
+            creds, _ = google.auth.default(scopes=['https://www.googleapis.com/auth/drive'])
+            self.credentials = creds
+            self._local = threading.local()
+            with self._folder_lock:
+                self._folder_cache.clear()
+            self.service = self._thread_service()
             self.log('✅ Authenticated', 'success')
             return True
         except Exception as e:
             return self._handle_error(e, "Authentication")
     
     def upload_file(self, file_path: str, folder_name: str = 'Torrent') -> bool:
+        try:
+            source = HashingFile(file_path)
+            try:
+                session_key = f'{os.path.abspath(file_path)}:{int(os.path.getmtime(file_path))}'
+                return self._upload_media(self._file_media(source), os.path.basename(file_path), source.size,
+                                          folder_name, session_key, source)
+            finally:
+                source.close()
+            
+        except Exception as e:
+            return self._handle_error(e, "Upload")
+    
+    def upload_zip_stream(self, sources: list, zip_name: str, folder_name: str = 'Torrent') -> bool:
+        try:
+            from googleapiclient.http import MediaIoBaseUpload
+            
+            stream = ZipStream(sources)
+            try:
+                self.log(f'🗜️ Zipping {len(sources)} files on the fly', 'info')
+                media = MediaIoBaseUpload(stream, mimetype='application/zip', chunksize=UPLOAD_CHUNK_MIN_MB * 1024**2, resumable=True)
+                if not self._upload_media(media, zip_name, stream.size, folder_name, f'zip:{zip_name}'):
+                    return False
+                for path, _ in sources:
+                    get_inventory().mark_uploaded(path, f'{folder_name}/{zip_name}')
+                get_inventory().save(force=True)
+                return True
+            finally:
+                stream.close()
+            
+        except Exception as e:
+            return self._handle_error(e, "Upload")
+    
+    def _report_progress(self, progress: int):
+        if self.progress_callback:
+            self.progress_callback(progress)
+        else:
+            print(f'  {progress}%', flush=True)
+    
+    def _thread_service(self):
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            import httplib2
+            import google_auth_httplib2
+            from googleapiclient.discovery import build
+            
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http())
+            service = build('drive', 'v3', http=http, cache_discovery=False)
+            self._local.service = service
+        return service
+    
+    def resolve_folder(self, folder_path: str, parent_id: Optional[str] = None) -> Optional[str]:
+        for name in [part for part in folder_path.replace('\\', '/').split('/') if part]:
+            key = (parent_id, name)
+            with self._folder_lock:
+                cached = self._folder_cache.get(key)
+                if cached and cached[1] > time.monotonic():
+                    parent_id = cached[0]
+                    continue
+                folder_id = self._find_or_create_folder(self._thread_service(), name, parent_id)
+                self._folder_cache[key] = (folder_id, time.monotonic() + FOLDER_CACHE_TTL_SECONDS)
+            parent_id = folder_id
+        return parent_id
+    
+    def _find_or_create_folder(self, service, name: str, parent_id: Optional[str] = None) -> str:
+        escaped = name.replace('\\', '\\\\').replace("'", "\\'")
+        query = f"mimeType='application/vnd.google-apps.folder' and name='{escaped}' and trashed=false"
+        if parent_id:
+            query += f" and '{parent_id}' in parents"
+        results = service.files().list(q=query, fields='files(id)', pageSize=1).execute()
+        folders = results.get('files', [])
+        
+        if folders:
+            return folders[0]['id']
+        folder_meta = {'name': name, 'mimeType': 'application/vnd.google-apps.folder'}
+        if parent_id:
+            folder_meta['parents'] = [parent_id]
+        folder = service.files().create(body=folder_meta, fields='id').execute()
+        return folder['id']
+    
+    def _file_media(self, source: HashingFile):
+        from googleapiclient.http import MediaIoBaseUpload
+        
+        mimetype = mimetypes.guess_type(source.path)[0] or 'application/octet-stream'
+        return MediaIoBaseUpload(source, mimetype=mimetype, chunksize=UPLOAD_CHUNK_MIN_MB * 1024**2, resumable=True)
+    
+    def _list_folder_files(self, folder_id: str) -> dict:
+        service = self._thread_service()
+        query = f"'{folder_id}' in parents and trashed=false and mimeType!='application/vnd.google-apps.folder'"
+        files = {}
+        page_token = None
+        while True:
+            results = service.files().list(q=query, fields='nextPageToken, files(id, name, size, md5Checksum)',
+                                           pageSize=1000, pageToken=page_token).execute()
+            for f in results.get('files', []):
+                files.setdefault(f['name'], []).append(f)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return files
+    
+    def _find_remote_file(self, folder_id: str, file_name: str) -> dict:
+        escaped = file_name.replace('\\', '\\\\').replace("'", "\\'")
+        results = self._thread_service().files().list(
+            q=f"name='{escaped}' and '{folder_id}' in parents and trashed=false",
+            fields='files(id, name, size, md5Checksum)', pageSize=100).execute()
+        return {file_name: results.get('files', [])}
+    
+    def cache_listings(self, enabled: bool):
+        with self._folder_lock:
+            self._listing_users += 1 if enabled else -1
+            if self._listing_users <= 0:
+                self._listing_users = 0
+                self._listings.clear()
+                finished = True
+            else:
+                finished = False
+        if finished:
+            self.hashes.save(force=True)
+    
+    def _remote_files(self, folder_id: str, file_name: str) -> dict:
+        with self._folder_lock:
+            cached = self._listings.get(folder_id)
+            batch = self._listing_users > 0
+        if cached is not None:
+            return cached
+        if not batch:
+            # A one-off upload only needs to know about its own name
+            return self._find_remote_file(folder_id, file_name)
+        files = self._list_folder_files(folder_id)
+        with self._folder_lock:
+            if self._listing_users:
+                files = self._listings.setdefault(folder_id, files)
+        return files
+    
+    def _remember_remote_file(self, folder_id: str, file_name: str, file_size: int, response: dict):
+        with self._folder_lock:
+            cached = self._listings.get(folder_id)
+            if cached is not None:
+                cached.setdefault(file_name, []).append({'id': response.get('id'), 'name': file_name, 'size': str(file_size),
+                                                         'md5Checksum': response.get('md5Checksum')})
+    
+    def _is_duplicate(self, file_path: str, file_name: str, file_size: int, remote_files: dict) -> bool:
+        candidates = [f for f in remote_files.get(file_name, [])
+                      if f.get('md5Checksum') and int(f.get('size', -1)) == file_size]
+        if not candidates:
+            return False
+        md5 = self.hashes.compute(file_path)
+        return any(f['md5Checksum'] == md5 for f in candidates)
+    
+    def _record_hash(self, source: HashingFile, response: dict):
+        md5 = source.hexdigest()
+        remote_md5 = response.get('md5Checksum')
+        if remote_md5 and remote_md5 != md5:
+            raise OSError(f'Checksum mismatch after uploading {source.path}')
+        self.hashes.put(source.path, md5)
+    
+    def _tune_chunk_size(self, chunk_size: int, sent: int, elapsed: float) -> int:
+        if sent <= 0 or elapsed <= 0:
+            return chunk_size
+        target = sent / elapsed * UPLOAD_CHUNK_TARGET_SECONDS
+        new_size = min(chunk_size * 2, max(chunk_size // 2, int(target)))
+        new_size = min(UPLOAD_CHUNK_MAX_MB * 1024**2, max(UPLOAD_CHUNK_MIN_MB * 1024**2, new_size))
+        return new_size // (256 * 1024) * (256 * 1024)
+    
+    def _send_media(self, service, media, file_name: str, folder_id: str, on_progress: Callable,
+                    session_key: Optional[str] = None):
+        import socket
+        import httplib2
+        from googleapiclient.errors import HttpError
+        
+        file_metadata = {'name': file_name, 'parents': [folder_id]}
+        request = service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink, md5Checksum')
+        
+        key = f'{folder_id}/{file_name}/{media.size()}/{session_key}' if session_key else None
+        saved_uri = self.sessions.get(key) if key else None
+        if saved_uri:
+            # Ask Drive how much of the earlier session it already has before sending anything
+            request.resumable_uri = saved_uri
+            request._in_error_state = True
+            logger.info(f"Resuming upload session for {file_name}")
+        
+        chunk_size = UPLOAD_CHUNK_MIN_MB * 1024**2
+        retries = 0
+        response = None
+        while response is None:
+            # MediaUpload has no public setter; next_chunk() reads the size from here on every call
+            media._chunksize = chunk_size
+            offset = request.resumable_progress
+            # After a restored session or an error the next call only asks Drive for its offset; it sends no data
+            probing = request._in_error_state
+            started = time.monotonic()
+            try:
+                status, response = request.next_chunk()
+            except HttpError as e:
+                if saved_uri and e.resp.status in (404, 410):
+                    logger.info(f"Saved upload session for {file_name} expired, starting over")
+                    self.sessions.remove(key)
+                    saved_uri = None
+                    request.resumable_uri = None
+                    request.resumable_progress = 0
+                    request._in_error_state = False
+                    continue
+                if e.resp.status not in UPLOAD_RETRYABLE_STATUSES or retries >= UPLOAD_MAX_RETRIES:
+                    raise
+                error = e
+            except (ConnectionError, TimeoutError, socket.timeout, httplib2.HttpLib2Error) as e:
+                # Local failures (a vanished source, a file changing under ZipStream) are not worth retrying
+                if retries >= UPLOAD_MAX_RETRIES:
+                    raise
+                error = e
+            else:
+                elapsed = time.monotonic() - started
+                sent = (status.resumable_progress if status else media.size()) - offset
+                if not probing:
+                    get_metrics().observe('drive_chunk_seconds', elapsed)
+                    get_metrics().inc('drive_uploaded_bytes_total', sent)
+                    if elapsed > 0:
+                        get_metrics().gauge('drive_upload_bytes_per_second', sent / elapsed)
+                retries = 0
+                if key and request.resumable_uri and request.resumable_uri != saved_uri:
+                    saved_uri = request.resumable_uri
+                    self.sessions.put(key, saved_uri)
+                if status:
+                    on_progress(status.resumable_progress)
+                    if not probing:
+                        chunk_size = self._tune_chunk_size(chunk_size, sent, elapsed)
+                continue
+            
+            get_metrics().inc('drive_chunk_errors_total')
+            retries += 1
+            chunk_size = max(UPLOAD_CHUNK_MIN_MB * 1024**2, chunk_size // 2 // (256 * 1024) * (256 * 1024))
+            request._in_error_state = request.resumable_uri is not None
+            delay = min(UPLOAD_BACKOFF_MAX_SECONDS, 2 ** retries) * random.uniform(0.5, 1.0)
+            self.log(f'⚠️ Upload error ({error}), retry {retries}/{UPLOAD_MAX_RETRIES} in {delay:.0f}s', 'warning')
+            time.sleep(delay)
+        
+        if key:
+            self.sessions.remove(key)
+        return response
+    
+    def _upload_media(self, media, file_name: str, file_size: int, folder_name: str,
+                      session_key: Optional[str] = None, source: Optional[HashingFile] = None) -> bool:
+        if not self.service:
+            if not self.authenticate():
+                return False
+        
+        self.log(f'📁 Folder: {folder_name}', 'info')
+        folder_id = self.resolve_folder(folder_name) or 'root'
+        
+        if source is not None and self._is_duplicate(source.path, file_name, file_size, self._remote_files(folder_id, file_name)):
+            self.log(f'⏭️ {file_name} is already in Drive, skipped', 'success')
+            get_inventory().mark_uploaded(source.path, folder_name)
+            return True
+        
+        self.log(f'⬆️ {file_name} ({file_size/(1024**3):.2f} GB)', 'info')
+        
+        last_progress = [0]
+        def on_progress(done: int):
+            progress = int(done / max(file_size, 1) * 100)
+            if progress - last_progress[0] >= 5:
+                self._report_progress(progress)
+                last_progress[0] = progress
+        
+        response = self._send_media(self._thread_service(), media, file_name, folder_id, on_progress, session_key)
+        self._remember_remote_file(folder_id, file_name, file_size, response)
+        if source is not None:
+            self._record_hash(source, response)
+            get_inventory().mark_uploaded(source.path, folder_name)
+            if not self._listing_users:
+                self.hashes.save(force=True)
+        
+        self.log('✅ Upload complete!', 'success')
+        self.log(f'🔗 {response.get("webViewLink", "N/A")}', 'success')
+        return True
+    
+    def upload_directory(self, local_dir: str, folder_name: str = 'Torrent', workers: int = UPLOAD_WORKERS) -> bool:
         try:
             if not self.service:
                 if not self.authenticate():
                     return False
             
-            from googleapiclient.http import MediaFileUpload
-            from googleapiclient.errors import HttpError
+            files = []
+            for root, dirs, names in os.walk(local_dir):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                files.extend(os.path.join(root, n) for n in sorted(names) if not n.startswith('.'))
+            if not files:
+                self.log('⚠️ Nothing to upload', 'warning')
+                return False
             
-            self.log(f'📁 Folder: {folder_name}', 'info')
-            query = f"mimeType='application/vnd.google-apps.folder' and name='{folder_name}' and trashed=false"
-            results = self.service.files().list(q=query, fields='files(id)', pageSize=1).execute()
-            folders = results.get('files', [])
+            root_name = os.path.basename(os.path.normpath(local_dir))
+            self.log(f'📁 Folder: {folder_name}/{root_name}', 'info')
+            root_id = self.resolve_folder(root_name, self.resolve_folder(folder_name))
             
-            if folders:
-                folder_id = folders[0]['id']
-            else:
-                folder_meta = {'name': folder_name, 'mimeType': 'application/vnd.google-apps.folder'}
-                folder = self.service.files().create(body=folder_meta, fields='id').execute()
-                folder_id = folder['id']
+            def mirror_folder(rel_dir: str) -> str:
+                return self.resolve_folder('' if rel_dir == '.' else rel_dir.replace(os.sep, '/'), root_id)
             
-            file_name = os.path.basename(file_path)
-            file_size = os.path.getsize(file_path)
-            self.log(f'⬆️ {file_name} ({file_size/(1024**3):.2f} GB)', 'info')
+            jobs = [(path, os.path.getsize(path), mirror_folder(os.path.relpath(os.path.dirname(path), local_dir)))
+                    for path in files]
+            remote_files = {folder_id: self._list_folder_files(folder_id) for folder_id in {job[2] for job in jobs}}
+            total_size = sum(size for _, size, _ in jobs)
+            self.log(f'⬆️ {len(jobs)} files ({total_size/(1024**3):.2f} GB), {workers} at a time', 'info')
             
-            file_metadata = {'name': file_name, 'parents': [folder_id]}
-            media = MediaFileUpload(file_path, chunksize=10*1024*1024, resumable=True)
-            request = self.service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink')
+            sent = {}
+            progress_lock = threading.Lock()
+            last_progress = [0]
+            def on_progress(path: str, done: int):
+                with progress_lock:
+                    sent[path] = done
+                    progress = int(sum(sent.values()) / max(total_size, 1) * 100)
+                    if progress - last_progress[0] >= 1:
+                        last_progress[0] = progress
+                        self._report_progress(progress)
             
-            response = None
-            last_progress = 0
-            while response is None:
-                status, response = request.next_chunk()
-                if status:
-                    progress = int(status.progress() * 100)
-                    if progress - last_progress >= 5:
-                        if self.progress_callback:
-                            self.progress_callback(progress)
+            def upload_one(path: str, size: int, folder_id: str) -> bool:
+                if self._is_duplicate(path, os.path.basename(path), size, remote_files[folder_id]):
+                    on_progress(path, size)
+                    get_inventory().mark_uploaded(path, folder_name)
+                    return False
+                source = HashingFile(path)
+                try:
+                    response = self._send_media(self._thread_service(), self._file_media(source), os.path.basename(path),
+                                                folder_id, lambda done: on_progress(path, done),
+                                                f'{os.path.abspath(path)}:{int(os.path.getmtime(path))}')
+                    self._record_hash(source, response)
+                finally:
+                    source.close()
+                get_inventory().mark_uploaded(path, folder_name)
+                on_progress(path, size)
+                return True
+            
+            failed = 0
+            skipped = 0
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='drive_upload') as pool:
+                futures = {pool.submit(upload_one, *job): job[0] for job in jobs}
+                for future in as_completed(futures):
+                    rel_path = os.path.relpath(futures[future], local_dir)
+                    try:
+                        if future.result():
+                            logger.info(f"Uploaded {rel_path}")
                         else:
-                            print(f'  {progress}%', flush=True)
-                        last_progress = progress
+                            skipped += 1
+                            logger.info(f"Skipped {rel_path}, already in Drive")
+                    except Exception as e:
+                        failed += 1
+                        logger.error(f"Upload of {rel_path} failed: {e}")
+                        self.log(f'⚠️ {rel_path}: {e}', 'warning')
             
-            self.log('✅ Upload complete!', 'success')
-            self.log(f'🔗 {response.get("webViewLink", "N/A")}', 'success')
+            get_inventory().save(force=True)
+            self.hashes.save(force=True)
+            if failed:
+                self.log(f'❌ {failed}/{len(jobs)} files failed to upload', 'error')
+                return False
+            self.log(f'✅ Uploaded {len(jobs) - skipped} files, {skipped} already in Drive', 'success')
             return True
             
         except Exception as e:
             return self._handle_error(e, "Upload")
 
 
+class StreamingUploadPipeline:
+    
+    def __init__(self, uploader: DriveUploader, folder_name: str = 'Torrent',
+                 window_bytes: int = PIPELINE_WINDOW_GB * 1024**3, delete_after_upload: bool = True,
+                 waves: bool = False):
+        self.uploader = uploader
+        self.folder_name = folder_name
+        self.window_bytes = window_bytes
+        self.delete_after_upload = delete_after_upload
+        self.waves = waves
+        self.failed = False
+        self.uploaded = 0
+        self._queue = queue.Queue()
+        self._window_used = 0
+        self._window_lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._worker = None
+    
+    def start(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name='pipeline_upload', daemon=True)
+            self._worker.start()
+    
+    def can_admit(self, size: int) -> bool:
+        with self._window_lock:
+            return self._window_used == 0 or self._window_used + size <= self.window_bytes
+    
+    def reserve(self, size: int):
+        with self._window_lock:
+            self._window_used += size
+    
+    def release(self, size: int):
+        with self._window_lock:
+            self._window_used = max(0, self._window_used - size)
+    
+    def submit(self, file_path: str, size: int, rel_dir: str = ''):
+        self._queue.put((file_path, size, rel_dir))
+    
+    def _run(self):
+        # One upload at a time into the same folders: list each Drive folder once for the pipeline's lifetime
+        self.uploader.cache_listings(True)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    self._queue.task_done()
+                    break
+                file_path, size, rel_dir = item
+                try:
+                    if self.failed or self._cancelled.is_set():
+                        continue
+                    if not self.uploader.upload_file(file_path, self.target_folder(rel_dir)):
+                        self.failed = True
+                        continue
+                    self.uploaded += 1
+                    if self.delete_after_upload:
+                        try:
+                            os.remove(file_path)
+                        except OSError as e:
+                            logger.warning(f"Could not remove uploaded file {file_path}: {e}")
+                finally:
+                    self.release(size)
+                    self._queue.task_done()
+        finally:
+            self.uploader.cache_listings(False)
+    
+    def target_folder(self, rel_dir: str = '') -> str:
+        return '/'.join(p for p in (self.folder_name, rel_dir.replace(os.sep, '/')) if p)
+    
+    def drain(self):
+        self._queue.join()
+    
+    def close(self, wait: bool = True) -> bool:
+        if not wait:
+            self._cancelled.set()
+        if self._worker is not None:
+            self._queue.put(None)
+            if wait:
+                self._worker.join()
+        return not self.failed and not self._cancelled.is_set()
+
+
+class JobQueue:
+    
+    ACTIVE_STATES = ('analyzing', 'waiting', 'downloading', 'zipping', 'uploading')
+    
+    def __init__(self, uploader: Optional[DriveUploader] = None, status_callback: Optional[Callable] = None,
+                 on_change: Optional[Callable] = None, state_path: str = os.path.join(STATE_DIR, 'jobs.json'),
+                 save_path: str = LOCAL_DIR):
+        self.uploader = uploader
+        self.status_callback = status_callback
+        self.on_change = on_change
+        self.state_path = state_path
+        self.save_path = save_path
+        self.session = get_global_session()
+        self._cond = threading.Condition()
+        self._jobs = {}
+        self._downloaders = {}
+        self._executor = None
+        self._load()
+        resumed = sum(1 for job in self._jobs.values() if job['state'] == 'queued')
+        if resumed:
+            self.log(f'🔁 Resuming {resumed} queued jobs', 'info')
+            self.start()
+    
+    def log(self, msg: str, style: str = 'info'):
+        if self.status_callback:
+            self.status_callback(msg, style)
+        else:
+            logger.info(msg)
+    
+    def _load(self):
+        try:
+            with open(self.state_path) as f:
+                jobs = json.load(f)
+        except (OSError, ValueError):
+            return
+        for job in jobs:
+            if job['state'] in self.ACTIVE_STATES:
+                job['state'] = 'queued'
+            self._jobs[job['id']] = job
+    
+    def _save(self):
+        _atomic_write(self.state_path, list(self._jobs.values()))
+    
+    def _update(self, job: dict, **changes):
+        with self._cond:
+            job.update(changes, updated=time.time())
+            if 'state' in changes:
+                job.setdefault('timings', {})[changes['state']] = job['updated']
+                self._save()
+            self._cond.notify_all()
+        if changes.get('state') in ('done', 'failed', 'stopped'):
+            timings = sorted(job.get('timings', {}).items(), key=lambda t: t[1])
+            durations = {state: round(end - start, 1) for (state, start), (_, end) in zip(timings, timings[1:])}
+            get_metrics().summary({'type': 'job', 'id': job['id'], 'name': job['name'], 'state': job['state'],
+                                   'bytes': job['size'], 'error': job['error'], 'durations': durations})
+        if self.on_change:
+            self.on_change(job)
+    
+    def _limit(self) -> int:
+        try:
+            return max(1, int(self.session.get_settings()['active_downloads']))
+        except Exception:
+            return 1
+    
+    def add(self, magnet_link: str, priority: int = 0, folder: Optional[str] = None, zip_upload: bool = False,
+            selected_files: Optional[list] = None, add_trackers: bool = True) -> str:
+        name = parse_qs(urlparse(magnet_link).query).get('dn', [''])[0] or magnet_link[:60]
+        job = {'id': uuid.uuid4().hex[:8], 'magnet': magnet_link, 'name': name, 'state': 'queued',
+               'priority': priority, 'folder': folder, 'zip': zip_upload, 'selected_files': selected_files,
+               'add_trackers': add_trackers, 'progress': 0.0, 'size': 0, 'error': None,
+               'added': time.time(), 'updated': time.time()}
+        with self._cond:
+            self._jobs[job['id']] = job
+            self._save()
+        self.log(f'➕ Queued {name}', 'info')
+        if self.on_change:
+            self.on_change(job)
+        self.start()
+        return job['id']
+    
+    def set_priority(self, job_id: str, priority: int):
+        with self._cond:
+            if job_id in self._jobs:
+                self._jobs[job_id]['priority'] = priority
+                self._save()
+        self.start()
+    
+    def cancel(self, job_id: str) -> bool:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job['state'] in ('done', 'failed', 'stopped'):
+                return False
+            if job['state'] in ('zipping', 'uploading'):
+                # The archiver and DriveUploader have no stop path; a half-written upload is worse than a finished one
+                self.log(f"⚠️ {job['name'][:30]} is {job['state']} and can no longer be cancelled", 'warning')
+                return False
+            job['cancelled'] = True
+            downloader = self._downloaders.get(job_id)
+            if job['state'] == 'queued':
+                job['state'] = 'stopped'
+                self._save()
+            self._cond.notify_all()
+        if downloader:
+            downloader.stop()
+        return True
+    
+    def jobs(self) -> list:
+        with self._cond:
+            return sorted((dict(job) for job in self._jobs.values()), key=lambda j: j['added'])
+    
+    def start(self):
+        with self._cond:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.session.get_settings()['active_limit'],
+                                                    thread_name_prefix='torrent_job')
+            running = sum(1 for job in self._jobs.values() if job['state'] in self.ACTIVE_STATES)
+            queued = sorted((job for job in self._jobs.values() if job['state'] == 'queued'),
+                            key=lambda j: (-j['priority'], j['added']))
+            for job in queued[:max(0, self._limit() - running)]:
+                job['state'] = 'analyzing'
+                self._executor.submit(self._run_job, job)
+            self._save()
+    
+    def _disk_fits(self, job: dict, needed: int) -> bool:
+        outstanding = sum(j['reserved'] * (1 - j['progress'] / 100) for j in self._jobs.values()
+                          if j is not job and j['state'] in self.ACTIVE_STATES and j.get('reserved'))
+        if not outstanding:
+            return True
+        return needed * 1.1 <= shutil.disk_usage(self.save_path).free - outstanding
+    
+    def _run_job(self, job: dict):
+        def progress(pct, down, up, peers, eta):
+            # download() clears any stop issued before it started, so re-issue it from inside the loop
+            if job.get('cancelled'):
+                downloader.stop()
+            if int(pct) != int(job['progress']):
+                self._update(job, progress=pct)
+            else:
+                job['progress'] = pct
+        
+        def status(msg, style):
+            self.log(f"[{job['name'][:30]}] {msg}", style)
+        
+        downloader = TorrentDownloader(progress, status)
+        with self._cond:
+            self._downloaders[job['id']] = downloader
+        try:
+            self._update(job, state='analyzing')
+            info = downloader.analyze_torrent(job['magnet'], job['add_trackers'], keep_handle=True)
+            if job.get('cancelled'):
+                self._update(job, state='stopped')
+                return
+            if not info:
+                self._update(job, state='failed', error='metadata')
+                return
+            
+            selected = job['selected_files']
+            size = sum(f['size'] for f in info['files'] if selected is None or f['index'] in selected)
+            needed = size * 2 if job['zip'] and not job['folder'] else size
+            self._update(job, name=info['name'], size=size)
+            
+            with self._cond:
+                while not self._disk_fits(job, needed) and not job.get('cancelled'):
+                    if job['state'] != 'waiting':
+                        job['state'] = 'waiting'
+                        self._save()
+                    self._cond.wait(30)
+                if job.get('cancelled'):
+                    self._update(job, state='stopped')
+                    return
+                job['reserved'] = needed
+            
+            self._update(job, state='downloading')
+            if not downloader.download(job['magnet'], self.save_path, job['add_trackers'], selected_files=selected):
+                self._update(job, state='stopped' if job.get('cancelled') else 'failed', error='download')
+                return
+            
+            target = os.path.join(self.save_path, info['name'])
+            if job['zip'] and not job['folder']:
+                self._update(job, state='zipping')
+                ZipArchiver(status).create(collect_zip_sources(target, self.save_path),
+                                           os.path.join(self.save_path, f"{info['name'].replace(' ', '_')}.zip"))
+            
+            if job['folder']:
+                self._update(job, state='uploading')
+                if job['zip']:
+                    ok = self.uploader.upload_zip_stream(collect_zip_sources(target, self.save_path),
+                                                         f"{info['name'].replace(' ', '_')}.zip", job['folder'])
+                elif os.path.isdir(target):
+                    ok = self.uploader.upload_directory(target, job['folder'])
+                else:
+                    ok = self.uploader.upload_file(target, job['folder'])
+                if not ok:
+                    self._update(job, state='failed', error='upload')
+                    return
+            
+            self._update(job, state='done', progress=100.0)
+        except Exception as e:
+            logger.exception(f"Job {job['id']} failed: {e}")
+            self._update(job, state='failed', error=str(e))
+        finally:
+            downloader.release_analyzed()
+            with self._cond:
+                self._downloaders.pop(job['id'], None)
+                job.pop('reserved', None)
+                self._cond.notify_all()
+            self.start()
+
+
+class LogSink:
+    
+    LEVELS = {'info': 0, 'success': 0, 'warning': 1, 'error': 2}
+    COLORS = {'info': '#1a73e8', 'success': '#188038', 'warning': '#e37400', 'error': '#d93025'}
+    
+    def __init__(self, render: Callable, capacity: int = LOG_BUFFER_LINES, interval: float = LOG_FLUSH_INTERVAL_SECONDS,
+                 spill_path: Optional[str] = LOG_SPILL_PATH, level: str = 'info'):
+        self.render = render
+        self.interval = interval
+        self.spill_path = spill_path
+        self.level = level
+        self._entries = collections.deque(maxlen=capacity)
+        self._spill_lines = []
+        self._spill_file = None
+        self._render_needed = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='log_sink', daemon=True)
+        self._thread.start()
+    
+    def write(self, msg: str, style: str = 'info'):
+        stamp = time.strftime('%H:%M:%S')
+        with self._lock:
+            self._entries.append((stamp, msg, style))
+            if self.spill_path:
+                self._spill_lines.append(f'{time.strftime("%Y-%m-%d")} {stamp} [{style.upper()}] {msg}\n')
+            if self.LEVELS.get(style, 0) >= self.LEVELS[self.level]:
+                self._render_needed = True
+        self._wake.set()
+    
+    def set_level(self, level: str):
+        self.level = level
+        with self._lock:
+            self._render_needed = True
+        self._wake.set()
+    
+    def _spill(self, lines: list):
+        try:
+            if self._spill_file is None:
+                os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+                self._spill_file = open(self.spill_path, 'a', encoding='utf-8')
+            self._spill_file.writelines(lines)
+            self._spill_file.flush()
+            if self._spill_file.tell() > LOG_SPILL_MAX_MB * 1024**2:
+                self._spill_file.close()
+                self._spill_file = None
+                os.replace(self.spill_path, f'{self.spill_path}.1')
+        except OSError as e:
+            logger.warning(f"Log spill disabled: {e}")
+            self.spill_path = None
+    
+    def _html(self) -> str:
+        threshold = self.LEVELS[self.level]
+        with self._lock:
+            entries = [e for e in self._entries if self.LEVELS.get(e[2], 0) >= threshold]
+        # column-reverse keeps the view pinned to the newest line, so lines are emitted newest-first
+        # and read oldest-to-newest top to bottom
+        lines = ''.join(
+            f'<div style="color:{self.COLORS.get(style, "#000")};">[{stamp}] {html.escape(msg)}</div>'
+            for stamp, msg, style in reversed(entries)
+        )
+        return (f'<div style="font-size:12px;display:flex;flex-direction:column-reverse;'
+                f'max-height:240px;overflow-y:auto;">{lines}</div>')
+    
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                lines, self._spill_lines = self._spill_lines, []
+                render, self._render_needed = self._render_needed, False
+            if lines and self.spill_path:
+                self._spill(lines)
+            if render:
+                try:
+                    self.render(self._html())
+                except Exception as e:
+                    logger.warning(f"Log render failed: {e}")
+            time.sleep(self.interval)
+
+
+class FileSelection:
+    
+    def __init__(self, files: list):
+        self.paths = [f['path'].replace('\\', '/') for f in files]
+        self.sizes = array.array('q', (f['size'] for f in files))
+        self.selected = bytearray(b'\x01' * len(files))
+        self.selected_count = len(files)
+        self.selected_bytes = sum(self.sizes)
+        self.children = collections.defaultdict(list)
+        self.dir_files = collections.defaultdict(list)
+        self.dir_members = collections.defaultdict(lambda: array.array('l'))
+        self.dir_size = collections.defaultdict(int)
+        self.dir_selected = collections.defaultdict(int)
+        self.file_dirs = []
+        
+        for i, path in enumerate(self.paths):
+            parts = path.split('/')[:-1]
+            ancestors = [''] + ['/'.join(parts[:d + 1]) for d in range(len(parts))]
+            for parent, child in zip(ancestors, ancestors[1:]):
+                if child not in self.dir_members:
+                    self.children[parent].append(child)
+            for d in ancestors:
+                self.dir_members[d].append(i)
+                self.dir_size[d] += self.sizes[i]
+                self.dir_selected[d] += 1
+            self.dir_files[ancestors[-1]].append(i)
+            self.file_dirs.append(ancestors)
+        
+        top = self.children.get('', [])
+        self.expanded = {''} | (set(top) if len(top) == 1 else set())
+        self._rows = None
+    
+    def __len__(self) -> int:
+        return len(self.sizes)
+    
+    def set(self, index: int, value: bool):
+        value = int(value)
+        if self.selected[index] == value:
+            return
+        self.selected[index] = value
+        delta = 1 if value else -1
+        self.selected_count += delta
+        self.selected_bytes += delta * self.sizes[index]
+        for d in self.file_dirs[index]:
+            self.dir_selected[d] += delta
+    
+    def set_many(self, indexes, value: bool):
+        for i in indexes:
+            self.set(i, value)
+    
+    def set_all(self, value: bool):
+        flag = 1 if value else 0
+        self.selected[:] = bytes([flag]) * len(self.selected)
+        self.selected_count = len(self.selected) * flag
+        self.selected_bytes = sum(self.sizes) * flag
+        for d, members in self.dir_members.items():
+            self.dir_selected[d] = len(members) * flag
+    
+    def set_dir(self, path: str, value: bool):
+        if self.dir_selected[path] == (len(self.dir_members[path]) if value else 0):
+            return
+        self.set_many(self.dir_members[path], value)
+    
+    def dir_state(self, path: str) -> bool:
+        return self.dir_selected[path] == len(self.dir_members[path])
+    
+    def toggle_dir(self, path: str):
+        self.expanded ^= {path}
+        self._rows = None
+    
+    def rows(self) -> list:
+        if self._rows is None:
+            rows = []
+            stack = [('', -1)]
+            while stack:
+                path, depth = stack.pop()
+                if path:
+                    rows.append(('dir', path, depth))
+                if path not in self.expanded:
+                    continue
+                rows.extend(('file', i, depth + 1) for i in self.dir_files.get(path, []))
+                stack.extend((child, depth + 1) for child in reversed(self.children.get(path, [])))
+            self._rows = rows
+        return self._rows
+    
+    def selected_indexes(self) -> list:
+        return [i for i, flag in enumerate(self.selected) if flag]
+
+
 class TorrentGUI:
     
     def __init__(self):
@@ -500,9 +3400,15 @@ class TorrentGUI:
             status_callback=self.add_log
         )
         self.torrent_info = None
-        self.file_checkboxes = []
+        self.file_selection = None
+        self.file_page = 0
+        self._rendering = False
         self._gui_lock = threading.Lock()
+        load_widgets()
+        os.makedirs(LOCAL_DIR, exist_ok=True)
         self.create_widgets()
+        self.queue = JobQueue(self.uploader, self.add_log, lambda job: self.render_queue())
+        self.render_queue()
     
     def create_widgets(self):
         try:
@@ -519,35 +3425,80 @@ class TorrentGUI:
         
         self.analyze_btn = widgets.Button(description='🔍 Analyze', button_style='info', layout=widgets.Layout(width='150px'))
         self.analyze_btn.on_click(self.on_analyze)
-        self.file_area = widgets.VBox([], layout=widgets.Layout(display='none'))
+        self.file_summary = widgets.HTML('')
+        sel_all = widgets.Button(description='All', layout=widgets.Layout(width='60px'))
+        desel_all = widgets.Button(description='None', layout=widgets.Layout(width='60px'))
+        sel_all.on_click(lambda b: self.on_select_all(True))
+        desel_all.on_click(lambda b: self.on_select_all(False))
+        page_prev = widgets.Button(description='◀', layout=widgets.Layout(width='40px'))
+        page_next = widgets.Button(description='▶', layout=widgets.Layout(width='40px'))
+        page_prev.on_click(lambda b: self.on_file_page(-1))
+        page_next.on_click(lambda b: self.on_file_page(1))
+        self.page_label = widgets.HTML('')
+        self.file_rows = []
+        for slot in range(FILE_PICKER_PAGE_SIZE):
+            toggle = widgets.Button(layout=widgets.Layout(width='32px', height='24px'))
+            cb = widgets.Checkbox(indent=False, layout=widgets.Layout(width='100%'), style={'description_width': 'initial'})
+            toggle.on_click(lambda b, slot=slot: self.on_file_toggle(slot))
+            cb.observe(lambda c, slot=slot: self.on_file_check(slot, c['new']), names='value')
+            self.file_rows.append((widgets.HBox([toggle, cb], layout=widgets.Layout(display='none')), toggle, cb))
+        self._row_keys = [None] * FILE_PICKER_PAGE_SIZE
+        self.file_area = widgets.VBox(
+            [widgets.HTML('<b>Select files:</b>'), self.file_summary,
+             widgets.HBox([sel_all, desel_all, page_prev, self.page_label, page_next])] + [row for row, _, _ in self.file_rows],
+            layout=widgets.Layout(display='none')
+        )
         self.step2 = widgets.HTML('<h3 style="margin:10px 0 5px;">2️⃣ Download</h3>')
         self.auto_zip = widgets.Checkbox(value=True, description='Auto-zip', indent=False)
         self.add_trackers = widgets.Checkbox(value=True, description='Add trackers', indent=False)
+        self.stream_upload = widgets.Checkbox(value=False, description='Stream to Drive', indent=False)
+        self.stream_http = widgets.Checkbox(value=False, description='Play while downloading', indent=False)
+        self.wave_mode = widgets.Checkbox(value=False, description='Waves (bigger than disk)', indent=False)
+        self.wave_mode.observe(lambda c: c['new'] and setattr(self.stream_upload, 'value', False), names='value')
+        self.stream_upload.observe(lambda c: c['new'] and setattr(self.wave_mode, 'value', False), names='value')
+        self.profile = widgets.Dropdown(options=list(SESSION_PROFILES), value=SESSION_PROFILE, description='Profile:', layout=widgets.Layout(width='220px'))
+        self.profile.observe(self.on_profile, names='value')
+        self.autotune = widgets.Checkbox(value=False, description='Auto-tune', indent=False)
+        self.autotune.observe(self.on_autotune, names='value')
         self.download_btn = widgets.Button(description='⬇️ Download', button_style='success', disabled=True, layout=widgets.Layout(width='150px'))
         self.download_btn.on_click(self.on_download)
         self.stop_btn = widgets.Button(description='⏹️ Stop', button_style='danger', disabled=True, layout=widgets.Layout(width='80px'))
         self.stop_btn.on_click(self.on_stop)
+        self.queue_btn = widgets.Button(description='➕ Queue', button_style='warning', layout=widgets.Layout(width='100px'))
+        self.queue_btn.on_click(self.on_queue)
+        self.queue_table = widgets.HTML('')
         self.dl_progress = widgets.FloatProgress(value=0, min=0, max=100, bar_style='', layout=widgets.Layout(width='100%'))
         self.dl_status = widgets.HTML('')
         self.step3 = widgets.HTML('<h3 style="margin:10px 0 5px;">3️⃣ Upload</h3>')
         self.file_selector = widgets.Dropdown(options=[], description='File:', disabled=True, layout=widgets.Layout(width='100%'))
         self.folder_input = widgets.Text(value='Torrent', description='Folder:', layout=widgets.Layout(width='300px'))
+        self.zip_on_upload = widgets.Checkbox(value=False, description='Zip on upload (no local .zip)', indent=False)
+        self.zip_on_upload.observe(lambda c: c['new'] and setattr(self.auto_zip, 'value', False), names='value')
+        self.auto_zip.observe(lambda c: c['new'] and setattr(self.zip_on_upload, 'value', False), names='value')
         self.upload_btn = widgets.Button(description='☁️ Upload', button_style='primary', disabled=True, layout=widgets.Layout(width='150px'))
         self.upload_btn.on_click(self.on_upload)
+        self.upload_folder_btn = widgets.Button(description='☁️ Upload folder', button_style='primary', disabled=True, layout=widgets.Layout(width='150px'))
+        self.upload_folder_btn.on_click(self.on_upload_folder)
         self.up_progress = widgets.FloatProgress(value=0, min=0, max=100, bar_style='', layout=widgets.Layout(width='100%'))
-        self.log_output = widgets.Output(layout={'border': '1px solid #ddd', 'padding': '5px', 'height': '250px', 'overflow': 'auto'})
+        self.log_view = widgets.HTML(layout={'border': '1px solid #ddd', 'padding': '5px', 'height': '250px', 'overflow': 'hidden'})
+        self.log_level = widgets.Dropdown(options=['info', 'warning', 'error'], value='info', description='Show:', layout=widgets.Layout(width='180px'))
+        self.log_sink = LogSink(self.render_log)
+        self.log_level.observe(lambda c: self.log_sink.set_level(c['new']), names='value')
         
         self.ui = widgets.VBox([
             self.title, widgets.HTML('<hr style="margin:5px 0;">'),
             self.step1, self.magnet_input, self.analyze_btn, self.file_area,
             widgets.HTML('<hr style="margin:5px 0;">'),
-            self.step2, widgets.HBox([self.auto_zip, self.add_trackers]),
-            widgets.HBox([self.download_btn, self.stop_btn]), self.dl_progress, self.dl_status,
+            self.step2, widgets.HBox([self.auto_zip, self.add_trackers, self.stream_upload, self.stream_http]),
+            widgets.HBox([self.profile, self.autotune, self.wave_mode]),
+            widgets.HBox([self.download_btn, self.stop_btn, self.queue_btn]), self.dl_progress, self.dl_status,
+            self.queue_table,
             widgets.HTML('<hr style="margin:5px 0;">'),
-            self.step3, self.file_selector, self.folder_input, self.upload_btn, self.up_progress,
+            self.step3, self.file_selector, widgets.HBox([self.folder_input, self.zip_on_upload]),
+            widgets.HBox([self.upload_btn, self.upload_folder_btn]), self.up_progress,
             widgets.HTML('<hr style="margin:5px 0;">'),
-            widgets.HTML('<h4 style="margin:5px 0;">📋 Log</h4>'),
-            self.log_output
+            widgets.HBox([widgets.HTML('<h4 style="margin:5px 0;">📋 Log</h4>'), self.log_level]),
+            self.log_view
         ], layout=widgets.Layout(padding='10px'))
         
         self.add_log('✅ Ready! Paste magnet link and click Analyze', 'info')
@@ -555,14 +3506,88 @@ class TorrentGUI:
             self.add_log('✅ Drive mounted', 'success')
     
     def add_log(self, msg: str, style: str = 'info'):
+        self.log_sink.write(msg, style)
+    
+    def render_log(self, value: str):
+        with self._gui_lock:
+            self.log_view.value = value
+    
+    def _format_size(self, size: int) -> str:
+        return f'{size / (1024**3):.2f} GB' if size >= 0.1 * 1024**3 else f'{size / (1024**2):.0f} MB'
+    
+    def update_file_summary(self):
+        sel = self.file_selection
+        with self._gui_lock:
+            self.file_summary.value = f'<small>{sel.selected_count}/{len(sel)} files, {sel.selected_bytes/(1024**3):.2f} GB</small>'
+    
+    def render_file_page(self):
+        sel = self.file_selection
+        rows = sel.rows()
+        pages = max(1, -(-len(rows) // FILE_PICKER_PAGE_SIZE))
+        self.file_page = max(0, min(self.file_page, pages - 1))
+        start = self.file_page * FILE_PICKER_PAGE_SIZE
+        self._rendering = True
         try:
-            from IPython.display import HTML, display
-            colors = {'info': '#1a73e8', 'success': '#188038', 'warning': '#e37400', 'error': '#d93025'}
-            with self._gui_lock:
-                with self.log_output:
-                    display(HTML(f'<span style="color:{colors.get(style, "#000")};font-size:12px;">[{time.strftime("%H:%M:%S")}] {msg}</span>'))
-        except ImportError:
-            print(f'[{time.strftime("%H:%M:%S")}] {msg}')
+            for slot, (row, toggle, cb) in enumerate(self.file_rows):
+                if start + slot >= len(rows):
+                    row.layout.display = 'none'
+                    self._row_keys[slot] = None
+                    continue
+                kind, key, depth = rows[start + slot]
+                indent = '\u2003' * depth
+                if kind == 'dir':
+                    toggle.description = '▾' if key in sel.expanded else '▸'
+                    toggle.layout.visibility = 'visible'
+                    cb.description = f"{indent}📁 {key.rsplit('/', 1)[-1]} ({self._format_size(sel.dir_size[key])})"
+                    cb.value = sel.dir_state(key)
+                else:
+                    toggle.layout.visibility = 'hidden'
+                    cb.description = f"{indent}{sel.paths[key].rsplit('/', 1)[-1]} ({self._format_size(sel.sizes[key])})"
+                    cb.value = bool(sel.selected[key])
+                row.layout.display = 'flex'
+                self._row_keys[slot] = (kind, key)
+        finally:
+            self._rendering = False
+        self.page_label.value = f'<small>&nbsp;{self.file_page + 1}/{pages}&nbsp;</small>'
+        self.update_file_summary()
+    
+    def _refresh_dir_rows(self):
+        self._rendering = True
+        try:
+            for slot, row_key in enumerate(self._row_keys):
+                if row_key and row_key[0] == 'dir':
+                    self.file_rows[slot][2].value = self.file_selection.dir_state(row_key[1])
+        finally:
+            self._rendering = False
+    
+    def on_file_check(self, slot: int, value: bool):
+        row_key = self._row_keys[slot]
+        if self._rendering or row_key is None:
+            return
+        kind, key = row_key
+        if kind == 'dir':
+            self.file_selection.set_dir(key, value)
+            self.render_file_page()
+        else:
+            self.file_selection.set(key, value)
+            self._refresh_dir_rows()
+            self.update_file_summary()
+    
+    def on_file_toggle(self, slot: int):
+        row_key = self._row_keys[slot]
+        if row_key and row_key[0] == 'dir':
+            self.file_selection.toggle_dir(row_key[1])
+            self.render_file_page()
+    
+    def on_file_page(self, step: int):
+        if self.file_selection:
+            self.file_page += step
+            self.render_file_page()
+    
+    def on_select_all(self, value: bool):
+        if self.file_selection:
+            self.file_selection.set_all(value)
+            self.render_file_page()
     
     def update_dl_progress(self, pct: float, down: float, up: float, peers: int, eta: str):
         with self._gui_lock:
@@ -573,18 +3598,45 @@ class TorrentGUI:
         with self._gui_lock:
             self.up_progress.value = pct
     
+    def render_queue(self):
+        jobs = self.queue.jobs() if hasattr(self, 'queue') else []
+        if not jobs:
+            self.queue_table.value = ''
+            return
+        colors = {'done': '#188038', 'failed': '#d93025', 'stopped': '#888', 'waiting': '#e37400'}
+        rows = ''.join(
+            f'<tr><td>{j["id"]}</td><td>{html.escape(j["name"][:40])}</td><td>{j["priority"]}</td>'
+            f'<td style="color:{colors.get(j["state"], "#1a73e8")};">{j["state"]}</td>'
+            f'<td>{j["progress"]:.0f}%</td><td>{j["size"] / (1024**3):.2f} GB</td></tr>'
+            for j in jobs
+        )
+        with self._gui_lock:
+            self.queue_table.value = (
+                '<table style="font-size:12px;width:100%;"><tr><th>ID</th><th>Name</th><th>Prio</th>'
+                f'<th>State</th><th>Progress</th><th>Size</th></tr>{rows}</table>'
+            )
+    
+    def on_queue(self, b):
+        magnets = [line.strip() for line in self.magnet_input.value.splitlines() if line.strip().startswith('magnet:')]
+        if not magnets:
+            self.add_log('❌ Enter at least one magnet link', 'error')
+            return
+        folder = self.folder_input.value.strip() or None
+        for magnet in magnets:
+            self.queue.add(magnet, folder=folder, zip_upload=self.zip_on_upload.value or self.auto_zip.value,
+                           add_trackers=self.add_trackers.value)
+        self.magnet_input.value = ''
+    
     def refresh_files(self):
         files = []
         try:
-            for root, _, filenames in os.walk(LOCAL_DIR):
-                for fn in filenames:
-                    if not fn.startswith('.'):
-                        fp = os.path.join(root, fn)
-                        try:
-                            sz = os.path.getsize(fp) / (1024**2)
-                            files.append((f'{fn} ({sz:.0f} MB)', fp))
-                        except OSError as e:
-                            logger.warning(f"Could not access file {fp}: {e}")
+            for entry in get_inventory().files():
+                label = f"{os.path.basename(entry['path'])} ({entry['size'] / (1024**2):.0f} MB)"
+                if entry['torrent']:
+                    label = f"{entry['torrent']} / {label}"
+                if entry['uploaded']:
+                    label += ' ☁️'
+                files.append((label, entry['path']))
         except OSError as e:
             logger.error(f"Could not scan directory {LOCAL_DIR}: {e}")
             self.add_log(f'⚠️ Could not refresh file list: {e}', 'warning')
@@ -593,6 +3645,7 @@ class TorrentGUI:
         if files:
             self.file_selector.disabled = False
             self.upload_btn.disabled = False
+            self.upload_folder_btn.disabled = False
     
     def on_analyze(self, b):
         magnet = self.magnet_input.value.strip()
@@ -603,39 +3656,16 @@ class TorrentGUI:
         self.analyze_btn.disabled = True
         
         def run():
+            if self.downloader:
+                self.downloader.release_analyzed()
+                self.downloader.stop_streaming()
             self.downloader = TorrentDownloader(None, self.add_log)
-            self.torrent_info = self.downloader.analyze_torrent(magnet, self.add_trackers.value)
+            self.torrent_info = self.downloader.analyze_torrent(magnet, self.add_trackers.value, keep_handle=True)
             
             if self.torrent_info:
-                self.file_checkboxes = []
-                summary = widgets.HTML('')
-                items = [widgets.HTML('<b>Select files:</b>'), summary]
-                
-                sel_all = widgets.Button(description='All', layout=widgets.Layout(width='60px'))
-                desel_all = widgets.Button(description='None', layout=widgets.Layout(width='60px'))
-                
-                sel_all.on_click(lambda b: [setattr(cb, 'value', True) for cb in self.file_checkboxes])
-                desel_all.on_click(lambda b: [setattr(cb, 'value', False) for cb in self.file_checkboxes])
-                
-                items.append(widgets.HBox([sel_all, desel_all]))
-                
-                def update_summary(*args):
-                    with self._gui_lock:
-                        sel = sum(1 for cb in self.file_checkboxes if cb.value)
-                        size = sum(self.torrent_info['files'][i]['size'] for i, cb in enumerate(self.file_checkboxes) if cb.value)
-                        summary.value = f'<small>{sel}/{len(self.file_checkboxes)} files, {size/(1024**3):.2f} GB</small>'
-                
-                for f in self.torrent_info['files']:
-                    sz = f"{f['size_gb']:.2f} GB" if f['size_gb'] >= 0.1 else f"{f['size_mb']:.0f} MB"
-                    cb = widgets.Checkbox(value=True, description=f"{f['path']} ({sz})", 
-                                         layout=widgets.Layout(width='100%'),
-                                         style={'description_width': 'initial'})
-                    cb.observe(lambda c: update_summary(), names='value')
-                    self.file_checkboxes.append(cb)
-                    items.append(cb)
-                
-                update_summary()
-                self.file_area.children = items
+                self.file_selection = FileSelection(self.torrent_info['files'])
+                self.file_page = 0
+                self.render_file_page()
                 self.file_area.layout.display = 'block'
                 self.download_btn.disabled = False
             
@@ -650,8 +3680,8 @@ class TorrentGUI:
             return
         
         selected = None
-        if self.torrent_info and self.file_checkboxes:
-            selected = [self.torrent_info['files'][i]['index'] for i, cb in enumerate(self.file_checkboxes) if cb.value]
+        if self.torrent_info and self.file_selection:
+            selected = [self.torrent_info['files'][i]['index'] for i in self.file_selection.selected_indexes()]
             if not selected:
                 self.add_log('❌ Select at least one file', 'error')
                 return
@@ -662,13 +3692,30 @@ class TorrentGUI:
         self.analyze_btn.disabled = True
         
         def run():
-            self.downloader = TorrentDownloader(self.update_dl_progress, self.add_log)
-            success = self.downloader.download(
-                magnet, LOCAL_DIR,
-                add_trackers=self.add_trackers.value,
-                auto_zip=self.auto_zip.value,
-                selected_files=selected
-            )
+            pipeline = None
+            if self.wave_mode.value:
+                budget = int(shutil.disk_usage(LOCAL_DIR).free * WAVE_BUDGET_FRACTION)
+                pipeline = StreamingUploadPipeline(self.uploader, self.folder_input.value or 'Torrent',
+                                                   window_bytes=budget, waves=True)
+            elif self.stream_upload.value:
+                pipeline = StreamingUploadPipeline(self.uploader, self.folder_input.value or 'Torrent')
+            
+            if self.downloader is None:
+                self.downloader = TorrentDownloader(self.update_dl_progress, self.add_log)
+            else:
+                self.downloader.progress_callback = self.update_dl_progress
+            self.downloader.file_completed_callback = self.on_file_completed
+            if pipeline and not self.uploader.service and not self.uploader.authenticate():
+                success = False
+            else:
+                success = self.downloader.download(
+                    magnet, LOCAL_DIR,
+                    add_trackers=self.add_trackers.value,
+                    auto_zip=self.auto_zip.value,
+                    selected_files=selected,
+                    pipeline=pipeline,
+                    stream=self.stream_http.value
+                )
             
             if success:
                 self.dl_progress.bar_style = 'success'
@@ -683,10 +3730,67 @@ class TorrentGUI:
         
         _thread_pool.submit(run)
     
+    def on_profile(self, change):
+        try:
+            apply_profile(change['new'])
+            self.add_log(f"⚙️ Profile: {change['new']}", 'info')
+        except Exception as e:
+            self.add_log(f'❌ Could not apply profile: {e}', 'error')
+    
+    def on_autotune(self, change):
+        tuner = get_auto_tuner(self.add_log)
+        if change['new']:
+            tuner.start()
+            self.add_log('⚙️ Auto-tune on', 'info')
+        else:
+            tuner.stop()
+    
+    def on_file_completed(self, index: int, path: str):
+        self.add_log(f'📄 Ready: {os.path.basename(path)}', 'success')
+    
     def on_stop(self, b):
         if self.downloader:
             self.downloader.stop()
     
+    def _selected_torrent_root(self) -> str:
+        top = os.path.relpath(self.file_selector.value, LOCAL_DIR).split(os.sep)[0]
+        return os.path.join(LOCAL_DIR, top)
+    
+    def on_upload_folder(self, b):
+        if not self.file_selector.value:
+            self.add_log('❌ Select a file', 'error')
+            return
+        
+        self.upload_folder_btn.disabled = True
+        self.up_progress.value = 0
+        
+        def run():
+            target = self._selected_torrent_root()
+            folder = self.folder_input.value or 'Torrent'
+            inventory = get_inventory()
+            info_hash = inventory.owner(self.file_selector.value)
+            files = inventory.torrent_files(info_hash) if info_hash else []
+            done = sum(1 for f in files if f['uploaded'] and f['uploaded']['folder'] == folder)
+            if files and done == len(files):
+                self.add_log(f'☁️ All {len(files)} files of this torrent are already in {folder}', 'success')
+                success = True
+            elif os.path.isdir(target):
+                if done:
+                    self.add_log(f'📦 {done}/{len(files)} files of this torrent are already in {folder}', 'info')
+                success = self.uploader.upload_directory(target, folder)
+            else:
+                success = self.uploader.upload_file(target, folder)
+            
+            if success:
+                self.up_progress.bar_style = 'success'
+                self.up_progress.value = 100
+            else:
+                self.up_progress.bar_style = 'danger'
+            
+            self.upload_folder_btn.disabled = False
+        
+        _thread_pool.submit(run)
+    
     def on_upload(self, b):
         if not self.file_selector.value:
             self.add_log('❌ Select a file', 'error')
@@ -696,10 +3800,20 @@ class TorrentGUI:
         self.up_progress.value = 0
         
         def run():
-            success = self.uploader.upload_file(
-                self.file_selector.value,
-                self.folder_input.value or 'Torrent'
-            )
+            if self.zip_on_upload.value:
+                target = self._selected_torrent_root()
+                top = os.path.basename(target)
+                zip_name = (os.path.splitext(top)[0] if os.path.isfile(target) else top).replace(' ', '_') + '.zip'
+                success = self.uploader.upload_zip_stream(
+                    collect_zip_sources(target, LOCAL_DIR),
+                    zip_name,
+                    self.folder_input.value or 'Torrent'
+                )
+            else:
+                success = self.uploader.upload_file(
+                    self.file_selector.value,
+                    self.folder_input.value or 'Torrent'
+                )
             
             if success:
                 self.up_progress.bar_style = 'success'
@@ -720,8 +3834,99 @@ class TorrentGUI:
             raise
 
 
-def main():
+def _print_status(msg: str, style: str = 'info'):
+    print(f'[{time.strftime("%H:%M:%S")}] {msg}', flush=True)
+
+
+def _print_progress(pct: float, down: float, up: float, peers: int, eta: str):
+    print(f'\r⬇️ {pct:5.1f}% | ↓{down:.0f} KB/s | 👥{peers} | ⏱️{eta}   ', end='', flush=True)
+
+
+def run_download(args) -> bool:
+    os.makedirs(args.save_path, exist_ok=True)
+    apply_profile(args.profile)
+    if args.trackers:
+        _print_status(f'📡 Imported {get_tracker_registry().import_file(args.trackers)} new trackers', 'info')
+    if args.autotune:
+        get_auto_tuner(_print_status).start()
+    if args.upload:
+        mount_drive()
+    uploader = DriveUploader(status_callback=_print_status) if args.upload else None
+    if uploader and not uploader.authenticate():
+        return False
+    
+    ok = True
+    downloader = None
+    for magnet in args.magnets:
+        if downloader:
+            downloader.stop_streaming()
+        downloader = TorrentDownloader(_print_progress, _print_status,
+                                       file_completed_callback=lambda idx, path: _print_status(f'\n📄 Ready: {path}'))
+        info = downloader.analyze_torrent(magnet, not args.no_trackers, keep_handle=True)
+        if not info:
+            ok = False
+            continue
+        pipeline = None
+        if uploader and args.waves is not None:
+            budget = int(args.waves * 1024**3) or int(shutil.disk_usage(args.save_path).free * WAVE_BUDGET_FRACTION)
+            pipeline = StreamingUploadPipeline(uploader, args.upload, window_bytes=budget, waves=True)
+        elif uploader and args.stream:
+            pipeline = StreamingUploadPipeline(uploader, args.upload)
+        success = downloader.download(
+            magnet, args.save_path,
+            add_trackers=not args.no_trackers,
+            auto_zip=args.zip and not args.upload,
+            selected_files=args.files,
+            pipeline=pipeline,
+            stream=args.serve,
+            file_order=args.files
+        )
+        print(flush=True)
+        if not success:
+            ok = False
+            continue
+        if not uploader or pipeline:
+            continue
+        
+        name = info['name']
+        target = os.path.join(args.save_path, name)
+        if not os.path.exists(target):
+            _print_status(f'❌ Downloaded files not found for {magnet[:60]}', 'error')
+            ok = False
+        elif args.zip:
+            ok &= uploader.upload_zip_stream(collect_zip_sources(target, args.save_path),
+                                             f"{name.replace(' ', '_')}.zip", args.upload)
+        elif os.path.isdir(target):
+            ok &= uploader.upload_directory(target, args.upload)
+        else:
+            ok &= uploader.upload_file(target, args.upload)
+    return ok
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Download torrents and upload them to Google Drive')
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('gui', help='Launch the widget GUI (default)')
+    dl = sub.add_parser('download', help='Download one or more magnets without the GUI')
+    dl.add_argument('magnets', nargs='+', metavar='MAGNET')
+    dl.add_argument('--upload', metavar='FOLDER', help='Upload to this Drive folder (nested paths allowed)')
+    dl.add_argument('--zip', action='store_true', help='Zip the download (streamed to Drive when uploading)')
+    dl.add_argument('--stream', action='store_true', help='Upload each file as soon as it finishes')
+    dl.add_argument('--waves', nargs='?', const=0.0, type=float, metavar='GB',
+                    help='Download, upload and delete in batches of at most GB (default: 80%% of free disk)')
+    dl.add_argument('--serve', action='store_true', help='Download sequentially and serve files over HTTP while downloading')
+    dl.add_argument('--files', type=lambda v: [int(i) for i in v.split(',')], help='Comma separated file indexes, in download priority order')
+    dl.add_argument('--save-path', default=LOCAL_DIR)
+    dl.add_argument('--no-trackers', action='store_true', help='Do not add public trackers')
+    dl.add_argument('--trackers', metavar='FILE', help='Import tracker URLs (one per line) into the tracker registry')
+    dl.add_argument('--profile', choices=list(SESSION_PROFILES), default=SESSION_PROFILE, help='Session settings profile')
+    dl.add_argument('--autotune', action='store_true', help='Adjust limits from measured throughput and memory')
+    return parser
+
+
+def launch_gui():
     try:
+        mount_drive()
         print('\n🚀 Launching GUI...\n')
         gui = TorrentGUI()
         gui.show()
@@ -734,5 +3939,18 @@ def main():
         print(f'❌ Error: {e}')
         sys.exit(1)
 
+
+def main(argv: Optional[list] = None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+    if argv is None:
+        argv = sys.argv[1:]
+        # Jupyter kernels pass their own argv (-f kernel-*.json); only honour an explicit subcommand there
+        if 'ipykernel' in sys.modules and argv[:1] not in (['download'], ['gui']):
+            argv = []
+    args = build_parser().parse_args(argv)
+    if args.command == 'download':
+        sys.exit(0 if run_download(args) else 1)
+    launch_gui()
+
 if __name__ == '__main__':
     main()